@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Measure the response decoding throughput of burp2json.py on a synthetic Burp
+export mixing HTML pages, images and JSON responses (plain, gzip encoded,
+chunked and arrays), comparing decoding every whole response as text and
+searching it for JSON with the bytes level HTTP parser.
+
+With --filter, measure instead reading the whole export against selecting the
+items of one API by URL before decoding them, on an export where only
+--api-share of the items are calls to it.
+"""
+
+import argparse
+import base64
+import binascii
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from burp2json import (Timings, decode_and_convert_to_json, extract_json_from_http_response, iter_json_responses,
+                       iter_responses)
+from common.burp import ItemFilter
+
+API_URL = r"^https://example\.com/api/"
+
+ITEM = """  <item>
+    <url><![CDATA[https://example.com/{path}]]></url>
+    <host ip="192.0.2.1">example.com</host>
+    <method><![CDATA[GET]]></method>
+    <status>200</status>
+    <mimetype>{mimetype}</mimetype>
+    <response base64="true"><![CDATA[{response}]]></response>
+  </item>
+"""
+
+
+def http_response(content_type, body, headers=()):
+    head = "\r\n".join(["HTTP/1.1 200 OK", f"Content-Type: {content_type}", *headers])
+    return head.encode() + b"\r\n\r\n" + body
+
+
+def chunked(body, size=4096):
+    chunks = [b"%x\r\n%s\r\n" % (len(body[i:i + size]), body[i:i + size]) for i in range(0, len(body), size)]
+    return b"".join(chunks) + b"0\r\n\r\n"
+
+
+def make_response(rng, kind, size):
+    """Return the mimetype and raw HTTP response of an item of `kind`"""
+    if kind == "html":
+        paragraphs = [f"<p>{' '.join(f'word{rng.randrange(1000)}' for _ in range(20))}</p>"
+                      for _ in range(size // 150)]
+        body = f"<html><body>\n{chr(10).join(paragraphs)}\n</body></html>".encode()
+        return "HTML", http_response("text/html; charset=utf-8", body)
+    if kind == "image":
+        body = b"\x89PNG\r\n\x1a\n" + rng.randbytes(size)
+        return "PNG", http_response("image/png", body)
+    objs = [{"id": rng.randrange(10 ** 6), "name": f"user{rng.randrange(10 ** 4)}", "score": rng.random()}
+            for _ in range(size // 60)]
+    body = json.dumps({"elements": objs} if kind != "array" else objs).encode()
+    if kind == "gzip":
+        return "JSON", http_response("application/json", gzip.compress(body), ["Content-Encoding: gzip"])
+    if kind == "chunked":
+        return "JSON", http_response("application/json", chunked(body), ["Transfer-Encoding: chunked"])
+    return "JSON", http_response("application/json", body)
+
+
+def make_export(path, items, size, api_share=0.0, seed=0):
+    """Write an export of `items` items, an `api_share` of them JSON responses
+    under /api/ and the others 40% HTML pages, 30% images and 30% JSON
+    responses elsewhere"""
+    rng = random.Random(seed)
+    json_kinds = ["json", "json", "gzip", "gzip", "chunked", "array"]
+    kinds = ["html"] * 8 + ["image"] * 6 + json_kinds
+    with open(path, "w") as file:
+        file.write('<?xml version="1.0"?>\n<items burpVersion="2021.8.2">\n')
+        for i in range(items):
+            if rng.random() < api_share:
+                kind, directory = rng.choice(json_kinds), "api"
+            else:
+                kind, directory = rng.choice(kinds), "other"
+            mimetype, response = make_response(rng, kind, size)
+            file.write(ITEM.format(path=f"{directory}/{i}", mimetype=mimetype,
+                                   response=base64.b64encode(response).decode()))
+        file.write("</items>\n")
+
+
+def legacy_decode(base64_encoded_response):
+    """Reference: decode the whole response as text and search it for JSON"""
+    try:
+        json_content = extract_json_from_http_response(base64.b64decode(base64_encoded_response).decode('utf-8'))
+        return json.loads(json_content) if json_content else None
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark burp2json.py response decoding")
+    parser.add_argument("--items", type=int, default=3000, help="Items to generate (default: %(default)s)")
+    parser.add_argument("--size", type=int, default=32768,
+                        help="Approximate response body size in bytes (default: %(default)s)")
+    parser.add_argument("--filter", action="store_true",
+                        help="Compare reading every item and selecting API items by URL before decoding")
+    parser.add_argument("--api-share", type=float, default=0.05,
+                        help="Share of API items with --filter (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.filter:
+        with tempfile.TemporaryDirectory() as tmp:
+            export = Path(tmp) / "export.xml"
+            make_export(export, args.items, args.size, args.api_share)
+            print(f"{args.items} items, {args.api_share:.0%} API calls, "
+                  f"{os.path.getsize(export) / 2 ** 20:.1f} MiB export")
+            for name, item_filter in [("all items", None), (f"--url {API_URL}", ItemFilter(url=API_URL))]:
+                timings = Timings()
+                with open(export, "rb") as file, contextlib.redirect_stderr(io.StringIO()):
+                    start = time.perf_counter()
+                    found = sum(1 for _ in iter_json_responses(file, timings=timings, item_filter=item_filter))
+                    elapsed = time.perf_counter() - start
+                decode = elapsed - timings["xml"]
+                print(f"  {name:<36} {elapsed:>7.2f} s ({timings['xml']:.2f} s XML, {decode:.2f} s decoding), "
+                      f"{found} JSON responses")
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export = Path(tmp) / "export.xml"
+        make_export(export, args.items, args.size)
+        with open(export) as file:
+            responses = list(iter_responses(file))
+        size = os.path.getsize(export)
+        print(f"{len(responses)} items, {size / 2 ** 20:.1f} MiB export")
+
+    for name, decode in [("whole text", legacy_decode), ("bytes parser", decode_and_convert_to_json)]:
+        # errors of undecodable responses are printed to stderr
+        with contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            results = [decode(response) for response in responses]
+            elapsed = time.perf_counter() - start
+        found = sum(result is not None for result in results)
+        print(f"  {name:<14} {elapsed:>7.2f} s {len(responses) / elapsed:>9.0f} items/s "
+              f"{size / 2 ** 20 / elapsed:>7.1f} MiB/s, {found} JSON responses")
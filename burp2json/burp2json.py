@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
 import argparse
-import xml.etree.ElementTree as ET
 import base64
-import json
 import sys
 import re
 import binascii
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.burp import PARSE_ERRORS, ItemFilter, iter_items
+from common.jsonbackend import BACKENDS, get_backend
+
+# responses sent to a worker at a time with --jobs
+BATCH_SIZE = 64
+STAGES = ("xml", "base64", "extract", "json", "write", "wait")
+HEADER_END = b"\r\n\r\n"
+# base64 characters decoded first to look at the headers of a response
+HEADER_PEEK = 4096
+# responses whose Content-Type contains one of these are parsed
+JSON_TYPES = ("json", "javascript", "text/plain")
+JSON_START = re.compile(rb"\s*[\[{]")
 
 def extract_json_from_http_response(http_response):
     pattern = re.compile(r'^\s*{', re.MULTILINE)
@@ -15,45 +33,327 @@ def extract_json_from_http_response(http_response):
         return json_content
     return None
 
-def decode_and_convert_to_json(base64_encoded_response):
+def parse_http_headers(head):
+    """Return the status line and a dict of the lower-cased header names
+    and values of a response head"""
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+def wanted_content_type(headers):
+    content_type = headers.get("content-type")
+    return content_type is None or any(t in content_type.lower() for t in JSON_TYPES)
+
+
+def peek_headers(base64_encoded_response):
+    """Return the headers of a response by decoding only the beginning of
+    it, or None if they are not there"""
+    try:
+        head = base64.b64decode(base64_encoded_response[:HEADER_PEEK])
+    except binascii.Error:
+        return None
+    end = head.find(HEADER_END)
+    if end == -1 or not head.startswith(b"HTTP/"):
+        return None
+    return parse_http_headers(head[:end])[1]
+
+
+def dechunk(data, pos):
+    """Join the chunks of a body sent with Transfer-Encoding: chunked,
+    starting at `pos` in `data`"""
+    view = memoryview(data)
+    chunks = []
+    while True:
+        eol = data.find(b"\r\n", pos)
+        if eol == -1:
+            raise ValueError("Truncated chunked body")
+        size = int(data[pos:eol].split(b";", 1)[0], 16)
+        pos = eol + 2
+        if size == 0:
+            return b"".join(chunks)
+        chunks.append(view[pos:pos + size])
+        pos += size + 2
+
+
+def decompress(body, encoding):
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        # some servers send raw deflate data instead of the zlib format
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    raise ValueError(f"Unsupported Content-Encoding {encoding}")
+
+
+def extract_json_body(decoded_bytes, any_content_type=False):
+    """Return the JSON text of an HTTP response given as bytes, or None.
+
+    The body is located with a memoryview, without copying the response,
+    and responses whose Content-Type is not JSON are skipped (unless
+    `any_content_type`) before decoding it. Chunked and gzip or deflate
+    encoded bodies are supported. Bodies starting with a JSON object or
+    array are returned as bytes or a memoryview. Payloads that are not HTTP
+    responses, and other bodies, are decoded and scanned with
+    extract_json_from_http_response()."""
+    end = decoded_bytes.find(HEADER_END)
+    if end == -1 or not decoded_bytes.startswith(b"HTTP/"):
+        return extract_json_from_http_response(decoded_bytes.decode('utf-8'))
+    _, headers = parse_http_headers(decoded_bytes[:end])
+    if not any_content_type and not wanted_content_type(headers):
+        return None
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = dechunk(decoded_bytes, end + len(HEADER_END))
+    else:
+        body = memoryview(decoded_bytes)[end + len(HEADER_END):]
+    encoding = headers.get("content-encoding", "identity").lower()
+    if encoding != "identity":
+        body = decompress(body, encoding)
+    if JSON_START.match(body):
+        return body
+    return extract_json_from_http_response(str(body, 'utf-8'))
+
+
+class Timings(dict):
+    """Seconds spent in each stage, counted by lap() since the previous
+    call to start() or lap()"""
+
+    def __init__(self):
+        super().__init__(dict.fromkeys(STAGES, 0.0))
+        self.last = time.perf_counter()
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self[stage] += now - self.last
+        self.last = now
+
+    def merge(self, other):
+        for stage, seconds in other.items():
+            self[stage] += seconds
+
+    def report(self, total, file=sys.stderr):
+        print("stage      seconds", file=file)
+        for stage in STAGES:
+            print(f"{stage:<8} {self[stage]:>9.2f}", file=file)
+        print(f"{'total':<8} {total:>9.2f} (wall clock)", file=file)
+
+
+def decode_and_convert_to_json(base64_encoded_response, timings=None, any_content_type=False, json_backend="auto"):
+    timings = timings if timings is not None else Timings()
+    timings.start()
     try:
+        if not any_content_type:
+            headers = peek_headers(base64_encoded_response)
+            if headers is not None and not wanted_content_type(headers):
+                timings.lap("base64")
+                return None
         decoded_bytes = base64.b64decode(base64_encoded_response)
-        decoded_string = decoded_bytes.decode('utf-8')
-        json_content = extract_json_from_http_response(decoded_string)
-        print(json_content)
+        timings.lap("base64")
+        json_content = extract_json_body(decoded_bytes, any_content_type)
+        timings.lap("extract")
         if json_content:
-            return json.loads(json_content)
+            response_json = get_backend(json_backend).loads(json_content)
+            timings.lap("json")
+            return response_json
         else:
             return None
-    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+    except (binascii.Error, UnicodeDecodeError, zlib.error, ValueError) as e:
         print(f"Error decoding or parsing response: {e}", file=sys.stderr)
         return None
 
+
+def decode_batch(base64_encoded_responses, any_content_type=False, json_backend="auto"):
+    """Decode a batch of responses, returning the JSON ones and the time
+    spent in each stage"""
+    timings = Timings()
+    results = []
+    for base64_encoded in base64_encoded_responses:
+        response_json = decode_and_convert_to_json(base64_encoded, timings, any_content_type, json_backend)
+        if response_json:
+            results.append(response_json)
+    return results, timings
+
+def iter_responses(input_file, item_filter=None):
+    """Yield the base64 encoded response of each item of a Burp export
+    accepted by `item_filter`"""
+    for item in iter_items(input_file, item_filter, defused=False):
+        response = item.response_base64
+        if response:
+            yield response
+
+
+def iter_batches(input_file, timings, item_filter=None):
+    """Yield lists of BATCH_SIZE responses, timing the XML stage"""
+    responses = iter_responses(input_file, item_filter)
+    while True:
+        timings.start()
+        batch = list(islice(responses, BATCH_SIZE))
+        timings.lap("xml")
+        if not batch:
+            return
+        yield batch
+
+
+def iter_json_responses(input_file, jobs=1, ordered=True, queue_size=None, timings=None,
+                        any_content_type=False, item_filter=None, json_backend="auto"):
+    """Yield the JSON responses of the items of a Burp export accepted by
+    `item_filter` (checked before decoding them). With more than one job,
+    batches of responses are decoded in a pool of processes, with at most
+    `queue_size` batches in flight, and yielded in input order unless
+    `ordered` is false. The time spent in each stage is added to
+    `timings`."""
+    timings = timings if timings is not None else Timings()
+    batches = iter_batches(input_file, timings, item_filter)
+
+    def emit(results):
+        for response_json in results:
+            start = time.perf_counter()
+            yield response_json
+            timings["write"] += time.perf_counter() - start
+
+    if jobs == 1:
+        for batch in batches:
+            results, batch_timings = decode_batch(batch, any_content_type, json_backend)
+            timings.merge(batch_timings)
+            yield from emit(results)
+        return
+
+    queue_size = queue_size or 2 * jobs
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < queue_size:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                else:
+                    pending.append(executor.submit(decode_batch, batch, any_content_type, json_backend))
+            if not pending:
+                return
+            timings.start()
+            if ordered:
+                done = [pending.popleft()]
+                done[0].result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending = deque(future for future in pending if future not in done)
+            timings.lap("wait")
+            for future in done:
+                results, batch_timings = future.result()
+                timings.merge(batch_timings)
+                yield from emit(results)
+
+
+def write_json_array(objs, output, backend=None, compact=False):
+    """Write objects as a JSON array indented like json.dump(..., indent=2),
+    or on a single line if `compact`, one element at a time. The array is
+    closed even if `objs` fails."""
+    backend = backend or get_backend("json")
+    count = 0
+    try:
+        for obj in objs:
+            if compact:
+                output.write("[" if count == 0 else ",")
+                output.write(backend.dumps(obj, compact=True))
+            else:
+                output.write("[\n  " if count == 0 else ",\n  ")
+                output.write(backend.dumps(obj, indent=2).replace("\n", "\n  "))
+            count += 1
+    finally:
+        if compact:
+            output.write("]" if count else "[]")
+        else:
+            output.write("\n]" if count else "[]")
+    return count
+
+
+def write_json_lines(objs, output, backend=None, compact=False):
+    backend = backend or get_backend("json")
+    count = 0
+    for obj in objs:
+        output.write(backend.dumps(obj, compact=compact))
+        output.write("\n")
+        count += 1
+    return count
+
+
+WRITERS = {"json": write_json_array, "jsonl": write_json_lines}
+
+
 def main():
     parser = argparse.ArgumentParser(description="Extract JSON content from base64-encoded responses in an XML file.")
     parser.add_argument("input_file", help="Input XML file containing base64-encoded responses")
     parser.add_argument("--output_file", help="Output JSON file (default: print to stdout)")
+    parser.add_argument("--format", choices=WRITERS, default="json",
+                        help="Write a JSON array or JSON Lines, one response per line (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Decode responses in a pool of N processes (default: %(default)s)")
+    parser.add_argument("--queue-size", type=int,
+                        help="Batches of responses in flight with --jobs (default: twice the jobs)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="With --jobs, write responses as soon as they are decoded instead of in input order")
+    parser.add_argument("--any-content-type", action="store_true",
+                        help="Look for JSON in every response, not only those whose Content-Type is JSON, "
+                             "JavaScript or plain text")
+    parser.add_argument("--host", action="append", metavar="GLOB",
+                        help="Only read items whose host matches this glob (can be repeated)")
+    parser.add_argument("--url", metavar="REGEX", help="Only read items whose URL matches this regular expression")
+    parser.add_argument("--status", action="append", type=int, metavar="CODE",
+                        help="Only read items with this response status (can be repeated)")
+    parser.add_argument("--mimetype", action="append", metavar="TYPE",
+                        help="Only read items with this MIME type, as shown by Burp (e.g. JSON, can be repeated)")
+    parser.add_argument("--json-backend", choices=BACKENDS, default="auto",
+                        help="Library decoding and encoding JSON, auto decoding with the fastest installed "
+                             "and encoding with the standard library (default: %(default)s)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write JSON without indentation or spaces after separators")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print the time spent in each stage to stderr")
     args = parser.parse_args()
 
+    write = WRITERS[args.format]
     try:
-        tree = ET.parse(args.input_file)
-        root = tree.getroot()
-
-        responses = []
-        for response_elem in root.findall('.//response'):
-            base64_encoded = response_elem.text
-            response_json = decode_and_convert_to_json(base64_encoded)
-            if response_json:
-                responses.append(response_json)
-
-        if args.output_file:
-            with open(args.output_file, 'w') as output_file:
-                json.dump(responses, output_file, indent=2)
-        else:
-            print(json.dumps(responses, indent=2))
+        backend = get_backend(args.json_backend)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        item_filter = ItemFilter(args.host, args.url, args.status, args.mimetype)
+    except re.error as e:
+        parser.error(f"invalid --url: {e}")
+    try:
+        input_file = open(args.input_file, 'rb')
+    except FileNotFoundError as e:
+        print(f"Error reading or parsing input XML: {e}", file=sys.stderr)
+        return
 
-    except (FileNotFoundError, ET.ParseError) as e:
+    output = open(args.output_file, 'w') if args.output_file else sys.stdout
+    timings = Timings()
+    start = time.perf_counter()
+    try:
+        responses = iter_json_responses(input_file, args.jobs, not args.unordered, args.queue_size, timings,
+                                        args.any_content_type, item_filter, backend.name)
+        write(responses, output, backend, args.compact)
+    except PARSE_ERRORS as e:
         print(f"Error reading or parsing input XML: {e}", file=sys.stderr)
+    finally:
+        input_file.close()
+        if output is sys.stdout:
+            if args.format == "json":
+                output.write("\n")
+        else:
+            output.close()
+        if args.timings:
+            timings.report(time.perf_counter() - start)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,6 @@
+"""
+Modules shared by the scripts of this repository.
+
+Scripts living in subdirectories add the repository root to `sys.path`
+before importing them.
+"""
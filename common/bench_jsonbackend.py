@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Compare the JSON backends of common/jsonbackend.py on payloads shaped like
+those of the scripts: LinkedIn voyager API responses full of `included`
+entries (inProfiles.py, burp2json.py) and arrays of flat API objects
+(parseJSONFromDir.py).
+
+Decoding is measured from bytes, as the scripts now do, and for reference
+with the standard library after decoding the bytes to a str first. Encoding
+is measured indented by two spaces, as burp2json.py writes by default, and
+compact.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.jsonbackend import available_backends, get_backend
+
+FIRST_NAMES = ["ana", "João", "maria", "Pedro", "José", "Élodie", "li", "Zoë", "carlos"]
+LAST_NAMES = ["silva", "Souza", "de Oliveira", "dos Santos", "Müller", "O'Neil", "Van Der Berg", "Nguyễn"]
+
+
+def voyager_payload(rng, entries):
+    """Return a search response with `entries` included profiles and images"""
+    included = []
+    for i in range(entries):
+        public_id = f"{rng.choice(FIRST_NAMES).lower()}-{rng.randrange(10 ** 6)}"
+        included.append({
+                "$type": "com.linkedin.voyager.dash.search.EntityResultViewModel",
+                "entityUrn": f"urn:li:fsd_entityResultViewModel:(urn:li:fsd_profile:{public_id},SEARCH_SRP)",
+                "title": {"text": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "attributesV2": []},
+                "primarySubtitle": {"text": "Analyst at Contoso\nSão Paulo"},
+                "summary": {"text": f"Current: Engineer at Contoso – {rng.random():.6f}"},
+                "navigationUrl": f"https://www.linkedin.com/in/{public_id}",
+                "image": {"attributes": [{"detailDataUnion": {"nonEntityProfilePicture": {
+                        "vectorImage": {"rootUrl": "https://media.licdn.com/dms/image/",
+                                        "artifacts": [{"width": size, "height": size,
+                                                       "expiresAt": 1700000000000 + i,
+                                                       "fileIdentifyingUrlPathSegment": f"{size}_{size}/{public_id}"}
+                                                      for size in (100, 200, 400, 800)]}}}}]},
+                "trackingId": "".join(rng.choice("abcdefABCDEF0123456789+/") for _ in range(24)),
+                })
+    return {"data": {"metadata": {"totalResultCount": entries}, "paging": {"start": 0, "count": entries}},
+            "included": included}
+
+
+def dump_payload(rng, rows):
+    """Return an array of `rows` flat objects, as dumped by an API"""
+    return [{"id": rng.randrange(10 ** 9),
+             "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+             "email": f"user{rng.randrange(10 ** 5)}@example.com",
+             "active": rng.random() < 0.5,
+             "score": rng.random() * 100,
+             "created": "2021-10-04T10:00:00Z",
+             "manager": None if rng.random() < 0.3 else rng.randrange(10 ** 9)}
+            for _ in range(rows)]
+
+
+def best_of(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the JSON backends")
+    parser.add_argument("--payloads", type=int, default=50, help="Payloads of each shape (default: %(default)s)")
+    parser.add_argument("--entries", type=int, default=100,
+                        help="Entries per voyager payload, and 20 times as many rows per dump (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each case (default: %(default)s)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    shapes = {"voyager": [voyager_payload(rng, args.entries) for _ in range(args.payloads)],
+              "API dump": [dump_payload(rng, 20 * args.entries) for _ in range(args.payloads)]}
+    backends = [get_backend(name) for name in available_backends()]
+    print(f"backends: {', '.join(backend.name for backend in backends)}")
+
+    for shape, objs in shapes.items():
+        payloads = [json.dumps(obj, ensure_ascii=False).encode() for obj in objs]
+        size = sum(map(len, payloads)) / 2 ** 20
+        print(f"{shape}: {len(payloads)} payloads, {size:.1f} MiB")
+        cases = [("json", "loads(str)", lambda: [json.loads(p.decode("utf-8")) for p in payloads])]
+        for backend in backends:
+            cases += [(backend.name, "loads(bytes)", lambda b=backend: [b.loads(p) for p in payloads]),
+                      (backend.name, "dumps indent=2", lambda b=backend: [b.dumps(o, indent=2) for o in objs]),
+                      (backend.name, "dumps compact", lambda b=backend: [b.dumps(o, compact=True) for o in objs])]
+        for name, operation, function in cases:
+            if "loads" in operation:
+                assert function() == objs, f"{name} decoded different objects"
+            elapsed = best_of(function, args.repeat)
+            print(f"  {name:<10} {operation:<16} {elapsed:>7.3f} s {size / elapsed:>8.1f} MiB/s")
@@ -0,0 +1,131 @@
+"""
+Streaming reader of Burp Suite saved items exports.
+
+Exports are parsed incrementally and each `<item>` is discarded once read, so
+memory does not grow with the size of the file. Items are yielded as
+lightweight `BurpItem` records whose request and response are only base64
+decoded when accessed, and filters on host, URL, status and mimetype are
+checked before that, so items of no interest cost nothing but XML parsing.
+"""
+
+import base64
+import fnmatch
+import re
+import xml.etree.ElementTree as ET
+
+try:
+    import defusedxml.ElementTree as DefusedET
+except ImportError:
+    DefusedET = None
+
+# errors raised by malformed exports (those of defusedxml are ValueErrors)
+PARSE_ERRORS = (ET.ParseError, ValueError)
+
+
+class BurpItem:
+    """An item of a Burp export. `request` and `response` are the decoded
+    bytes of the message (None if absent), decoded on first access."""
+
+    __slots__ = ("url", "host", "method", "status", "mimetype", "_request", "_response")
+
+    def __init__(self, url, host, method, status, mimetype, request=None, response=None):
+        self.url = url
+        self.host = host
+        self.method = method
+        self.status = status
+        self.mimetype = mimetype
+        # (text, base64) pairs as found in the export
+        self._request = request
+        self._response = response
+
+    @classmethod
+    def from_element(cls, elem):
+        fields = {child.tag: child for child in elem}
+
+        def text(tag):
+            child = fields.get(tag)
+            return child.text or "" if child is not None else ""
+
+        def message(tag):
+            child = fields.get(tag)
+            if child is None or not child.text:
+                return None
+            return child.text, child.get("base64") == "true"
+
+        status = text("status")
+        return cls(text("url"), text("host"), text("method"), int(status) if status.isdigit() else None,
+                   text("mimetype"), message("request"), message("response"))
+
+    @staticmethod
+    def _decode(message):
+        if message is None:
+            return None
+        data, encoded = message
+        return base64.b64decode(data) if encoded else data.encode("utf-8")
+
+    @property
+    def request(self):
+        if self._request is not None and not isinstance(self._request, bytes):
+            self._request = self._decode(self._request)
+        return self._request
+
+    @property
+    def response(self):
+        if self._response is not None and not isinstance(self._response, bytes):
+            self._response = self._decode(self._response)
+        return self._response
+
+    @property
+    def response_base64(self):
+        """The response as base64 text, without decoding it if the export has
+        it encoded already"""
+        if self._response is None:
+            return None
+        if isinstance(self._response, bytes):
+            return base64.b64encode(self._response).decode("ascii")
+        data, encoded = self._response
+        return data if encoded else base64.b64encode(data.encode("utf-8")).decode("ascii")
+
+
+class ItemFilter:
+    """Select items whose host matches one of the `hosts` globs, whose URL
+    matches the `url` regex and whose status and mimetype (compared without
+    case, as in Burp's MIME type column) are among those given. Criteria left
+    to None are not checked."""
+
+    def __init__(self, hosts=None, url=None, statuses=None, mimetypes=None):
+        self.hosts = [host.lower() for host in hosts] if hosts else None
+        self.url = re.compile(url) if isinstance(url, str) else url
+        self.statuses = set(statuses) if statuses else None
+        self.mimetypes = {mimetype.lower() for mimetype in mimetypes} if mimetypes else None
+
+    def __call__(self, item):
+        if self.hosts is not None and not any(fnmatch.fnmatchcase(item.host.lower(), host) for host in self.hosts):
+            return False
+        if self.url is not None and not self.url.search(item.url):
+            return False
+        if self.statuses is not None and item.status not in self.statuses:
+            return False
+        if self.mimetypes is not None and item.mimetype.lower() not in self.mimetypes:
+            return False
+        return True
+
+
+def iter_items(source, item_filter=None, defused=True):
+    """Yield the items of a Burp export (a path or a binary file) accepted by
+    `item_filter`, clearing each of them once read.
+
+    The export is parsed with defusedxml when `defused` and it is installed.
+    Raises ValueError if the root element is not `<items>`."""
+    iterparse = DefusedET.iterparse if defused and DefusedET is not None else ET.iterparse
+    context = iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    if root.tag != "items":
+        raise ValueError(f"Unexpected root element '{root.tag}'")
+    for event, elem in context:
+        if event == "end" and elem.tag == "item":
+            item = BurpItem.from_element(elem)
+            elem.clear()
+            root.clear()
+            if item_filter is None or item_filter(item):
+                yield item
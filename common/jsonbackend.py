@@ -0,0 +1,140 @@
+"""
+JSON decoding and encoding through the fastest library installed.
+
+orjson (decoding and encoding) and pysimdjson (decoding only) are used when
+available, falling back to the standard library. Every backend decodes bytes
+and memoryviews directly, so that bodies need not be copied into a str
+first, and gives the same objects as the standard library: documents a fast
+backend rejects or cannot represent exactly (integers beyond 64 bits, NaN,
+lone surrogates) are decoded by the standard library instead.
+
+Encoding with orjson differs from the standard library: non-ASCII characters
+are written as they are, NaN as null, floats in another notation (1e16) and
+integers beyond 64 bits are not supported. "auto" thus only uses a fast
+backend for decoding, orjson has to be chosen explicitly to encode with it.
+"""
+
+import json
+import re
+from functools import lru_cache
+
+# "auto" decodes with the first of the others that is installed
+BACKENDS = ("auto", "orjson", "simdjson", "json")
+# digits turned into "0" and anything else into " ", to look for long numbers
+DIGITS = bytes(0x30 if 0x30 <= i <= 0x39 else 0x20 for i in range(256))
+DIGIT_RUN = b"0" * 19
+# a number of 19 digits or more, which may not fit in 64 bits
+BIG_INT_RE = re.compile(rb'(?:^|"\s*:|[\[,])\s*-?\d{19}')
+
+
+def may_have_big_int(data):
+    """Tell whether a document may hold an integer beyond 64 bits, looking
+    for a long run of digits first as it is much cheaper than the regex"""
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    elif isinstance(data, memoryview):
+        data = bytes(data)
+    return DIGIT_RUN in data.translate(DIGITS) and BIG_INT_RE.search(data) is not None
+
+
+class StdlibBackend:
+    name = "json"
+
+    def loads(self, data):
+        """Decode a str, bytes or memoryview"""
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
+
+    def dumps(self, obj, indent=None, compact=False):
+        """Encode `obj` as a str, indented by `indent` spaces if given, and
+        without spaces after separators if `compact`"""
+        return json.dumps(obj, indent=indent, separators=(",", ":") if compact else None)
+
+
+class OrjsonBackend(StdlibBackend):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def loads(self, data):
+        # orjson reads integers beyond 64 bits as floats
+        if may_have_big_int(data):
+            return super().loads(data)
+        try:
+            return self.orjson.loads(data)
+        except self.orjson.JSONDecodeError:
+            return super().loads(data)
+
+    def dumps(self, obj, indent=None, compact=False):
+        # orjson output is always compact, and only indents by two spaces
+        if indent not in (None, 2):
+            return super().dumps(obj, indent, compact)
+        try:
+            return self.orjson.dumps(obj, option=self.orjson.OPT_INDENT_2 if indent else 0).decode()
+        except self.orjson.JSONEncodeError:
+            # integers beyond 64 bits, among others
+            return super().dumps(obj, indent, compact)
+
+
+class SimdjsonBackend(StdlibBackend):
+    name = "simdjson"
+
+    def __init__(self):
+        import simdjson
+        self.parser = simdjson.Parser()
+
+    def loads(self, data):
+        try:
+            return self.parser.parse(data, True)
+        except (ValueError, RuntimeError):
+            # RuntimeError is raised on integers beyond 64 bits
+            return super().loads(data)
+
+
+class AutoBackend(StdlibBackend):
+    """Decode with a fast backend, encode with the standard library"""
+
+    def __init__(self, decoder):
+        self.decoder = decoder
+        self.name = decoder.name
+
+    def loads(self, data):
+        return self.decoder.loads(data)
+
+
+BACKEND_CLASSES = {"orjson": OrjsonBackend, "simdjson": SimdjsonBackend, "json": StdlibBackend}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name="auto"):
+    """Return the backend called `name`, one of BACKENDS.
+
+    Raises ValueError if it is unknown or not installed."""
+    if name == "auto":
+        for cls in (OrjsonBackend, SimdjsonBackend):
+            try:
+                return AutoBackend(cls())
+            except ImportError:
+                continue
+        return StdlibBackend()
+    if name not in BACKEND_CLASSES:
+        raise ValueError(f"Unknown JSON backend {name!r}")
+    try:
+        return BACKEND_CLASSES[name]()
+    except ImportError:
+        raise ValueError(f"JSON backend {name!r} is not installed")
+
+
+def available_backends():
+    """Return the names of the backends installed"""
+    names = []
+    for name, cls in BACKEND_CLASSES.items():
+        try:
+            cls()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
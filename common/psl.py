@@ -0,0 +1,221 @@
+"""
+Offline Public Suffix List index.
+
+The list (a user-supplied `public_suffix_list.dat` or the snapshot bundled with
+`tldextract`) is compiled once into a flat dictionary of suffix flags and
+pickled in the cache directory. Loading it afterwards takes a few milliseconds
+and never touches the network. Lookups follow the same rules as `tldextract`.
+"""
+
+import hashlib
+import importlib.util
+import ipaddress
+import os
+import pickle
+import re
+import string
+from collections import namedtuple
+from pathlib import Path
+
+# bump whenever the layout of the compiled index changes
+INDEX_VERSION = 1
+PRIVATE_SEPARATOR = "// ===BEGIN PRIVATE DOMAINS==="
+RULE_RE = re.compile(r"^(?P<suffix>[.*!]*\w[\S]*)", re.UNICODE | re.MULTILINE)
+IPV4_RE = re.compile(
+    r"^(?:(?:[0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])\.){3}"
+    r"(?:[0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])$",
+    re.ASCII,
+)
+SCHEME_CHARS = set(string.ascii_letters + string.digits + "+-.")
+DOTS = str.maketrans({"。": ".", "．": ".", "｡": "."})
+
+# flags of each suffix in the index
+NODE = 1  # some rule ends with this suffix
+RULE = 2  # this suffix is a rule by itself
+WILDCARD = 4  # "*.suffix" is a rule
+EXCEPTION = 8  # "!suffix" is a rule
+
+
+# same fields as tldextract's ExtractResult
+ExtractResult = namedtuple("ExtractResult", ["subdomain", "domain", "suffix"])
+
+
+class PSLNotFound(LookupError):
+    """No Public Suffix List could be found"""
+    pass
+
+
+def bundled_psl():
+    """Return the path of the snapshot bundled with tldextract, without
+    importing it"""
+    spec = importlib.util.find_spec("tldextract")
+    if spec is None or spec.origin is None:
+        raise PSLNotFound("tldextract is not installed, use a PSL file instead")
+    path = Path(spec.origin).parent / ".tld_set_snapshot"
+    if not path.is_file():
+        raise PSLNotFound(f"Snapshot not found at {path}")
+    return path
+
+
+def default_cache_dir():
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "utils"
+
+
+def compile_psl(text, include_private=False):
+    """Compile the text of a Public Suffix List into an index"""
+    public, _, private = text.partition(PRIVATE_SEPARATOR)
+    rules = [m.group("suffix") for m in RULE_RE.finditer(public)]
+    if include_private:
+        rules.extend(m.group("suffix") for m in RULE_RE.finditer(private))
+    return compile_rules(rules)
+
+
+def compile_rules(rules):
+    """Compile rules in PSL syntax (e.g. `co.uk`, `*.ck` or `!www.ck`) into
+    an index"""
+    index = {}
+    for rule in rules:
+        rule = rule.lower()
+        if rule.startswith("!"):
+            index[rule[1:]] = index.get(rule[1:], 0) | EXCEPTION
+            labels = rule[1:].split(".")[1:]
+        elif rule.startswith("*."):
+            index[rule[2:]] = index.get(rule[2:], 0) | WILDCARD
+            labels = rule[2:].split(".")
+        else:
+            index[rule] = index.get(rule, 0) | RULE
+            labels = rule.split(".")
+        # every parent of a rule is a node that lookups can walk through
+        for i in range(len(labels)):
+            suffix = ".".join(labels[i:])
+            index[suffix] = index.get(suffix, 0) | NODE
+    return index
+
+
+def load_index(path=None, include_private=False, cache_dir=None):
+    """Load the compiled index of the PSL at `path` (default: the snapshot
+    bundled with tldextract), compiling and caching it on first use"""
+    path = Path(path) if path else bundled_psl()
+    stat = path.stat()
+    key = f"{INDEX_VERSION}:{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{include_private}"
+    cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+    cache_file = cache_dir / f"psl-{hashlib.sha1(key.encode()).hexdigest()}.pickle"
+
+    try:
+        with open(cache_file, "rb") as file:
+            return PublicSuffixIndex(pickle.load(file))
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    index = compile_psl(path.read_text(encoding="utf-8"), include_private)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as file:
+            pickle.dump(index, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # read-only home or similar, just don't cache
+        pass
+    return PublicSuffixIndex(index)
+
+
+def netloc(url):
+    """Return the host part of a URL-like string, as tldextract does"""
+    slashes = url.find("//")
+    if slashes == 0:
+        url = url[2:]
+    elif slashes >= 2 and url[slashes - 1] == ":" and not set(url[:slashes - 1]) - SCHEME_CHARS:
+        url = url[slashes + 2:]
+    authority = url.partition("/")[0].partition("?")[0].partition("#")[0]
+    host = authority.rpartition("@")[-1]
+    if host and host[0] == "[":
+        address, bracket, _ = host.partition("]")
+        if bracket:
+            return f"{address}]"
+    return host.partition(":")[0].strip().rstrip(".。．｡")
+
+
+def decode_label(label):
+    label = label.lower()
+    if label.startswith("xn--"):
+        try:
+            return label.encode("ascii").decode("idna")
+        except UnicodeError:
+            pass
+    return label
+
+
+def lookup_labels(labels):
+    """Return `labels` as compared to the index: lowercased, and decoded
+    from punycode if need be"""
+    lowered = ".".join(labels).lower()
+    if "xn--" in lowered:
+        return [decode_label(label) for label in labels]
+    return lowered.split(".")
+
+
+class PublicSuffixIndex:
+    """Compiled Public Suffix List supporting tldextract-like lookups"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def suffix_index(self, labels):
+        """Return the position of the first suffix label in `labels`, or
+        `len(labels)` if there is no known suffix"""
+        index = self.index
+        position = suffix_position = len(labels)
+        labels = lookup_labels(labels)
+        node = ""
+        for label in reversed(labels):
+            child = label + "." + node if node else label
+            flags = index.get(child, 0)
+            if flags & NODE:
+                position -= 1
+                node = child
+                if flags & RULE:
+                    suffix_position = position
+                continue
+            if node and index.get(node, 0) & WILDCARD:
+                return position if flags & EXCEPTION else position - 1
+            break
+        return suffix_position
+
+    def tail_depth(self, labels):
+        """Return the number of trailing labels of `labels` that decide its
+        registered domain: those walked through the index, the one a wildcard
+        or exception rule applies to, and the domain label"""
+        index = self.index
+        depth = 0
+        node = ""
+        for label in reversed(lookup_labels(labels)):
+            child = label + "." + node if node else label
+            if not index.get(child, 0) & NODE:
+                break
+            depth += 1
+            node = child
+        return depth + 2 if index.get(node, 0) & WILDCARD else depth + 1
+
+    def extract(self, url):
+        """Split `url` into subdomain, domain and suffix"""
+        host = netloc(url)
+        if not host.isascii():
+            host = host.translate(DOTS)
+        if len(host) >= 4 and host[0] == "[" and host[-1] == "]":
+            try:
+                ipaddress.IPv6Address(host[1:-1])
+            except ValueError:
+                pass
+            else:
+                return ExtractResult("", host, "")
+
+        labels = host.split(".")
+        position = self.suffix_index(labels)
+        if position == len(labels):
+            if len(labels) == 4 and host[:1].isdecimal() and IPV4_RE.match(host):
+                return ExtractResult("", host, "")
+            return ExtractResult(".".join(labels[:-1]), labels[-1], "")
+        subdomain = ".".join(labels[:position - 1]) if position >= 2 else ""
+        domain = labels[position - 1] if position > 0 else ""
+        return ExtractResult(subdomain, domain, ".".join(labels[position:]))
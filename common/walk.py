@@ -0,0 +1,106 @@
+"""
+Lazy file discovery for the scripts taking root directories.
+
+Directories are listed with `os.scandir()` and walked depth first without
+recursion, yielding each file as soon as its directory has been read, in the
+order a recursive walk would. The type information of `DirEntry` is used, so
+regular files and directories cost no `stat()` call. Optionally, the
+subdirectories of each directory are listed ahead by a pool of threads, which
+pays off on network filesystems.
+"""
+
+import fnmatch
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# what to do with symbolic links: follow them all, follow those pointing to
+# files only, or ignore them
+SYMLINK_POLICIES = ("follow", "files", "skip")
+
+
+def matches(entry, patterns):
+    """Tell whether the name or the path of an entry match one of the globs"""
+    return any(fnmatch.fnmatch(entry.name, pattern) or fnmatch.fnmatch(entry.path, pattern)
+               for pattern in patterns)
+
+
+def list_dir(path, onerror=None):
+    """Return the entries of a directory, or an empty list if it cannot be
+    read, after passing the OSError to `onerror`"""
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+        return []
+
+
+def walk_files(roots, max_depth=None, include=None, exclude=None, symlinks="follow",
+               threads=1, onerror=None):
+    """Yield the paths of the files under the `roots` directories (roots that
+    are files are yielded as they are).
+
+    Only files whose name or path match one of the `include` globs (if any)
+    are yielded, and files and directories matching one of the `exclude`
+    globs are skipped. Directories are walked down to `max_depth` levels
+    below the roots (0 for the roots only, None for no limit). `symlinks` is
+    one of SYMLINK_POLICIES; links leading back to a directory being walked
+    are never followed. Subdirectories are listed ahead in `threads` threads
+    if more than one is given, and listing errors are passed to `onerror`."""
+    if symlinks not in SYMLINK_POLICIES:
+        raise ValueError(f"Unknown symlink policy {symlinks!r}")
+    exclude = exclude or []
+    executor = ThreadPoolExecutor(threads) if threads > 1 else None
+    # listings submitted to the executor, by directory path
+    listings = {}
+
+    def can_descend(depth):
+        return max_depth is None or depth < max_depth
+
+    def open_dir(path, depth, realpath, stack):
+        future = listings.pop(path, None)
+        entries = future.result() if future is not None else list_dir(path, onerror)
+        if executor is not None and can_descend(depth):
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and not matches(entry, exclude):
+                    listings[entry.path] = executor.submit(list_dir, entry.path, onerror)
+        stack.append((iter(entries), depth, realpath))
+
+    try:
+        for root in roots:
+            root = os.fspath(root)
+            if not os.path.isdir(root):
+                yield root
+                continue
+            stack = []
+            open_dir(root, 0, os.path.realpath(root), stack)
+            while stack:
+                entries, depth, realpath = stack[-1]
+                entry = next(entries, None)
+                if entry is None:
+                    stack.pop()
+                    continue
+                if matches(entry, exclude):
+                    continue
+                is_link = entry.is_symlink()
+                if is_link and symlinks == "skip":
+                    continue
+                try:
+                    is_file = entry.is_file()
+                    is_dir = not is_file and entry.is_dir()
+                except OSError:
+                    continue
+                if is_file:
+                    if not include or matches(entry, include):
+                        yield entry.path
+                elif is_dir and can_descend(depth):
+                    if not is_link:
+                        open_dir(entry.path, depth + 1, os.path.join(realpath, entry.name), stack)
+                    elif symlinks == "follow":
+                        target = os.path.realpath(entry.path)
+                        if all(target != ancestor for _, _, ancestor in stack):
+                            open_dir(entry.path, depth + 1, target, stack)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
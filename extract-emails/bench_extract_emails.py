@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the engines of extract_emails.py against the reference regex engine
+on sparse, dense and binary corpora, and check that every engine finds the
+same set of addresses.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import extract_emails
+
+WORDS = [b"lorem", b"ipsum", b"dolor", b"sit", b"amet", b"consectetur",
+         b"adipiscing", b"elit", b"sed", b"do", b"eiusmod", b"tempor"]
+DOMAINS = [b"example.com", b"contoso.co.uk", b"mail-1.org", b"corp.io"]
+
+
+def random_email(rng):
+    local = b".".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+    return local + b"%d@" % rng.randrange(1000) + rng.choice(DOMAINS)
+
+
+def text_corpus(rng, size, email_ratio):
+    parts = []
+    length = 0
+    while length < size:
+        part = random_email(rng) if rng.random() < email_ratio else rng.choice(WORDS)
+        parts.append(part)
+        parts.append(rng.choice([b" ", b" ", b"\n", b", "]))
+        length += len(part) + 1
+    return b"".join(parts)
+
+
+def binary_corpus(rng, size, email_ratio):
+    parts = []
+    length = 0
+    while length < size:
+        if rng.random() < email_ratio:
+            part = random_email(rng)
+        else:
+            part = rng.randbytes(64)
+        parts.append(part)
+        length += len(part)
+    return b"".join(parts)
+
+
+CORPORA = {
+    "sparse": lambda rng, size: text_corpus(rng, size, 0.0005),
+    "dense": lambda rng, size: text_corpus(rng, size, 0.5),
+    "binary": lambda rng, size: binary_corpus(rng, size, 0.001),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extract_emails engines")
+    parser.add_argument("--size", type=int, default=32 * 1024 * 1024,
+                        help="Size of each corpus in bytes (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engines = list(extract_emails.ENGINES)
+    print(f"{'corpus':<8} {'emails':>8}" + "".join(f" {engine:>11}" for engine in engines))
+    for name, generate in CORPORA.items():
+        with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as file:
+            file.write(generate(rng, args.size))
+        try:
+            timings = {}
+            results = {}
+            for engine in engines:
+                start = time.perf_counter()
+                results[engine] = set(extract_emails.extract_emails(file.name, engine=engine))
+                timings[engine] = time.perf_counter() - start
+        finally:
+            os.unlink(file.name)
+
+        for engine in engines:
+            if results[engine] != results["regex"]:
+                raise SystemExit(f"Engine '{engine}' disagrees with the regex on the {name} corpus")
+        megabytes = args.size / 2 ** 20
+        print(f"{name:<8} {len(results['regex']):>8}"
+              + "".join(f" {megabytes / timings[engine]:>7.1f}MB/s" for engine in engines))
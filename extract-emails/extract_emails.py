@@ -2,30 +2,305 @@
 import sys
 import re
 import argparse
+import fnmatch
+import mmap
+import os
+import tempfile
+import zlib
+from multiprocessing import Pool
 
-def extract_emails(file_path):
+EMAIL_REGEX = rb'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+\.[A-Za-z]{2,}(?:\.[A-Za-z]{1,})?\b'
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
+# any byte that cannot be part of an address
+SEPARATOR_PATTERN = re.compile(rb'[^A-Za-z0-9._%+@-]')
+# bytes scanned per window
+CHUNK_SIZE = 16 * 1024 * 1024
+# how far past the end of a window to look for a separator, so that no
+# address is split between two windows
+OVERLAP = 4096
+
+
+def byte_table(chars):
+    """Build a 256-entry lookup table telling which bytes belong to `chars`"""
+    table = [False] * 256
+    for char in chars:
+        table[char] = True
+    return table
+
+
+ALPHA = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+DIGITS = b'0123456789'
+LOCAL_BYTES = byte_table(ALPHA + DIGITS + b'._%+-')
+LABEL_BYTES = byte_table(ALPHA + DIGITS + b'-')
+ALPHA_BYTES = byte_table(ALPHA)
+WORD_BYTES = byte_table(ALPHA + DIGITS + b'_')
+DOT = ord('.')
+# byte classes for the local part: word characters ('w'), other address
+# characters ('p') and everything else ('o')
+BYTE_CLASSES = bytes(ord('w') if WORD_BYTES[i] else ord('p') if LOCAL_BYTES[i] else ord('o')
+                     for i in range(256))
+# how many bytes before an '@' are classified at once
+LOOKBEHIND = 64
+# windows with more than one '@' every DENSE_RATIO bytes are left to the regex
+DENSE_RATIO = 256
+# bytes at the start of each window used to estimate the density of '@'
+DENSITY_SAMPLE = 64 * 1024
+
+
+def match_domain(data, pos, endpos):
+    """Match the domain part of EMAIL_REGEX at data[pos:endpos].
+    Return the position right after it, or 0 if there is no match."""
+    i = pos
+    while i < endpos and LABEL_BYTES[data[i]]:
+        i += 1
+    if i == pos or i >= endpos or data[i] != DOT:
+        return 0
+    i += 1
+    tld_end = i
+    while tld_end < endpos and ALPHA_BYTES[data[tld_end]]:
+        tld_end += 1
+    if tld_end - i < 2:
+        return 0
+    # optional second level suffix, as in ".co.uk"
+    if tld_end < endpos and data[tld_end] == DOT:
+        end = tld_end + 1
+        while end < endpos and ALPHA_BYTES[data[end]]:
+            end += 1
+        if end > tld_end + 1 and (end == endpos or not WORD_BYTES[data[end]]):
+            return end
+    if tld_end == endpos or not WORD_BYTES[data[tld_end]]:
+        return tld_end
+    return 0
+
+
+def match_local(data, pos, at):
+    """Match the local part of EMAIL_REGEX ending at the '@' in data[at],
+    not starting before `pos`. Return its (leftmost) start or -1."""
+    lo = max(pos, at - LOOKBEHIND)
+    classes = data[lo:at].translate(BYTE_CLASSES)
+    start = classes.rfind(b'o') + 1
+    if start == 0 and lo > pos:
+        # the run is longer than the lookbehind, walk it back byte by byte
+        while lo > pos and LOCAL_BYTES[data[lo - 1]]:
+            lo -= 1
+        classes = data[lo:at].translate(BYTE_CLASSES)
+    # the local part starts at the first word boundary of the run
+    prev_word = lo + start > 0 and WORD_BYTES[data[lo + start - 1]]
+    i = classes.find(b'p' if prev_word else b'w', start)
+    return lo + i if i != -1 else -1
+
+
+def find_emails_anchored(data, pos=0, endpos=None):
+    """Return the same matches as `EMAIL_PATTERN.findall(data, pos, endpos)`,
+    but only look around '@' bytes instead of trying the regex everywhere"""
+    if endpos is None:
+        endpos = len(data)
+    emails = []
+    at = data.find(b'@', pos, endpos)
+    while at != -1:
+        end = match_domain(data, at + 1, endpos)
+        if end:
+            start = match_local(data, pos, at)
+            if start != -1:
+                emails.append(data[start:end])
+                pos = end
+        at = data.find(b'@', at + 1, endpos)
+    return emails
+
+
+def find_emails(data, pos=0, endpos=None):
+    """Pick the fastest engine for data[pos:endpos]: looking around each '@'
+    costs more than running the regex once '@' bytes get too frequent"""
+    if endpos is None:
+        endpos = len(data)
+    sample = data[pos:min(pos + DENSITY_SAMPLE, endpos)]
+    if sample.count(b'@') * DENSE_RATIO > len(sample):
+        return EMAIL_PATTERN.findall(data, pos, endpos)
+    return find_emails_anchored(data, pos, endpos)
+
+
+ENGINES = {
+    'auto': find_emails,
+    'anchored': find_emails_anchored,
+    'regex': EMAIL_PATTERN.findall,
+}
+
+
+def scan_window(data, pos, end, size, overlap=OVERLAP, engine=find_emails):
+    """Find emails in data[pos:end], extending the window up to `overlap`
+    bytes (without going past `size`) until it ends on a separator.
+    Return the matches and the position where the next window starts."""
+    limit = min(end + overlap, size)
+    separator = SEPARATOR_PATTERN.search(data, end, limit)
+    # without a separator the window is cut at `limit` (only happens on
+    # runs of address characters longer than `overlap`)
+    window_end = separator.start() if separator else limit
+    return engine(data, pos, window_end), window_end
+
+
+def scan_mmap(data, chunk_size=CHUNK_SIZE, overlap=OVERLAP, engine=find_emails):
+    """Yield emails found in a memory-mapped file, one window at a time"""
+    size = len(data)
+    pos = 0
+    while pos < size:
+        matches, pos = scan_window(data, pos, min(pos + chunk_size, size), size,
+                                   overlap, engine)
+        yield from matches
+
+
+def scan_stream(file, chunk_size=CHUNK_SIZE, overlap=OVERLAP, engine=find_emails):
+    """Yield emails found in a binary stream that cannot be memory-mapped,
+    keeping at most `chunk_size` plus `overlap` bytes in memory"""
+    buffer = b""
+    eof = False
+    while not eof:
+        data = file.read(chunk_size)
+        eof = not data
+        buffer += data
+        size = len(buffer)
+        # keep scanning windows until the unread tail fits in the overlap
+        pos = 0
+        while pos < size and (eof or size - pos > overlap):
+            end = size if eof else size - overlap
+            matches, pos = scan_window(buffer, pos, end, size, overlap, engine)
+            yield from matches
+        buffer = buffer[pos:]
+
+
+def scan_emails(file_path, chunk_size=CHUNK_SIZE, overlap=OVERLAP, engine=find_emails):
+    """Yield every (lowercased) email found in a file, scanning it as bytes
+    with constant memory regardless of its size"""
+    with open(file_path, 'rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty files, pipes and other special files
+            for email in scan_stream(file, chunk_size, overlap, engine):
+                yield email.decode('ascii').lower()
+            return
+        with data:
+            for email in scan_mmap(data, chunk_size, overlap, engine):
+                yield email.decode('ascii').lower()
+
+
+def extract_emails(file_path, chunk_size=CHUNK_SIZE, engine='auto'):
     try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            emails =re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+\.[A-Za-z]{2,}(?:\.[A-Za-z]{1,})?\b', content)
-            return [email.lower() for email in emails]
+        return list(scan_emails(file_path, chunk_size, engine=ENGINES[engine]))
     except FileNotFoundError:
         print(f"File not found: {file_path}")
         return []
+    except OSError as e:
+        print(f"Cannot read {file_path}: {e}", file=sys.stderr)
+        return []
+
+
+def unique_emails_in_file(task):
+    """Return the set of emails of a single file (worker task in --jobs mode)"""
+    file_path, chunk_size, engine = task
+    return set(extract_emails(file_path, chunk_size, engine))
+
+
+def find_files(paths, include=None, exclude=None):
+    """Yield the files to scan: regular paths as they are, and the regular
+    files under directories (recursively) whose name or path match one of the
+    `include` globs (if any) and none of the `exclude` globs"""
+    def matches(path, patterns):
+        return any(fnmatch.fnmatch(os.path.basename(path), pattern)
+                   or fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in sorted(dirs) if not matches(os.path.join(root, d), exclude or [])]
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                if include and not matches(file_path, include):
+                    continue
+                if exclude and matches(file_path, exclude):
+                    continue
+                # FIFOs would block forever, sockets and devices can't be read
+                if not os.path.isfile(file_path):
+                    continue
+                yield file_path
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Extract unique email addresses from one or more input files.")
-    parser.add_argument("files", nargs="+", metavar="FILE", help="Input file(s) to extract email addresses from.")
-    args = parser.parse_args()
 
+def scan_files(file_paths, chunk_size=CHUNK_SIZE, engine='auto', jobs=1):
+    """Yield the set of emails of each file, scanning files in a pool of
+    `jobs` processes if more than one is requested"""
+    tasks = ((file_path, chunk_size, engine) for file_path in file_paths)
+    if jobs <= 1:
+        yield from map(unique_emails_in_file, tasks)
+        return
+    with Pool(jobs) as pool:
+        yield from pool.imap_unordered(unique_emails_in_file, tasks, chunksize=16)
+
+
+def dedup_in_memory(email_sets):
     unique_emails = set()
-    for file_path in args.files:
-        emails = extract_emails(file_path)
+    for emails in email_sets:
         unique_emails.update(emails)
+    yield from unique_emails
+
+
+def dedup_on_disk(email_sets, partitions=64, directory=None):
+    """Deduplicate emails by spilling them to `partitions` temporary files
+    (by hash), then yield the unique emails of one partition at a time.
+    Memory is bound by the size of the largest partition."""
+    with tempfile.TemporaryDirectory(prefix="extract_emails-", dir=directory) as tmpdir:
+        paths = [os.path.join(tmpdir, f"{i}.txt") for i in range(partitions)]
+        files = [open(path, 'w') for path in paths]
+        try:
+            for emails in email_sets:
+                for email in emails:
+                    files[zlib.crc32(email.encode()) % partitions].write(email + "\n")
+        finally:
+            for file in files:
+                file.close()
+        for path in paths:
+            with open(path) as file:
+                unique_emails = set(file.read().splitlines())
+            os.unlink(path)
+            yield from unique_emails
+
 
-    if unique_emails:
-        # print("Unique email addresses found:")
-        for email in unique_emails:
-            print(email)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract unique email addresses from one or more input files.")
+    parser.add_argument("files", nargs="+", metavar="FILE",
+                        help="Input file(s) or directories (searched recursively) to extract email addresses from.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="BYTES",
+                        help="Bytes scanned at a time (default: %(default)s).")
+    parser.add_argument("--engine", choices=ENGINES, default='auto',
+                        help="Matching engine: look around '@' bytes only, run the full regex "
+                             "(reference), or pick one per chunk based on the density of '@' "
+                             "(default: %(default)s).")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="In directories, only scan the files whose own name or path matches this glob "
+                             "(can be repeated).")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="Skip files and directories matching this glob (can be repeated).")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="Scan files in a pool of N processes (default: %(default)s).")
+    parser.add_argument("--spill", action="store_true",
+                        help="Deduplicate on disk through hash-partitioned temporary files, "
+                             "for more addresses than fit in memory.")
+    parser.add_argument("--partitions", type=int, default=64, metavar="N",
+                        help="Number of temporary files used by --spill (default: %(default)s).")
+    parser.add_argument("--tmpdir", metavar="DIR",
+                        help="Directory for the temporary files of --spill (default: system temp dir).")
+    args = parser.parse_args()
+
+    email_sets = scan_files(find_files(args.files, args.include, args.exclude),
+                            args.chunk_size, args.engine, args.jobs)
+    if args.spill:
+        unique_emails = dedup_on_disk(email_sets, args.partitions, args.tmpdir)
     else:
+        unique_emails = dedup_in_memory(email_sets)
+
+    found = False
+    for email in unique_emails:
+        found = True
+        print(email)
+    if not found:
         print("No email addresses found in the files.")
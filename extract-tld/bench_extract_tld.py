@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compare the offline PSL index used by extract_tld.py (--psl/--no-fetch) with
+plain tldextract: startup latency of a fresh interpreter up to the first
+lookup, and lookups per second.
+"""
+
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from common.psl import RULE_RE, bundled_psl, load_index
+
+STARTUP = {
+    "tldextract": "import tldextract\n"
+                  "tldextract.TLDExtract(suffix_list_urls=())('www.example.co.uk')",
+    "psl index": f"import sys\nsys.path.insert(0, {str(ROOT)!r})\n"
+                 "from common.psl import load_index\n"
+                 "load_index().extract('www.example.co.uk')",
+}
+
+
+def startup_latency(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def sample_hosts(count, seed=0):
+    rng = random.Random(seed)
+    suffixes = [m.group("suffix").lstrip("!*.")
+                for m in RULE_RE.finditer(bundled_psl().read_text(encoding="utf-8"))]
+    return [f"{rng.choice(['www', 'mail', 'a.b', 'dev'])}.example{rng.randrange(100)}.{rng.choice(suffixes)}"
+            for _ in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the offline PSL index against tldextract")
+    parser.add_argument("--runs", type=int, default=5, help="Startup runs (default: %(default)s)")
+    parser.add_argument("--hosts", type=int, default=200000, help="Hosts to look up (default: %(default)s)")
+    args = parser.parse_args()
+
+    # make sure the compiled index is cached before measuring
+    load_index()
+    print("startup latency (median)")
+    for name, code in STARTUP.items():
+        print(f"  {name:<12} {startup_latency(code, args.runs) * 1000:>8.1f} ms")
+
+    import tldextract
+    hosts = sample_hosts(args.hosts)
+    extractors = {
+        "tldextract": tldextract.TLDExtract(suffix_list_urls=()),
+        "psl index": load_index().extract,
+    }
+    print("lookups per second")
+    for name, extract in extractors.items():
+        extract(hosts[0])
+        start = time.perf_counter()
+        for host in hosts:
+            extract(host)
+        print(f"  {name:<12} {len(hosts) / (time.perf_counter() - start):>10.0f}")
@@ -1,36 +1,298 @@
 #!/usr/bin/env python3
 import sys
-import tldextract
+import argparse
+import hashlib
+import heapq
+import math
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+from multiprocessing import Pool
+from pathlib import Path
 
-def extract_tlds(hosts):
-    tlds = []
-    for host in hosts:
-        ext = tldextract.extract(host)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.psl import DOTS, PSLNotFound, PublicSuffixIndex, compile_rules, load_index, netloc
+
+# trailing labels deciding the registered domain when the rules of the PSL
+# used by tldextract cannot be read, as no public suffix has more than 7
+TAIL_LABELS = 9
+CACHE_SIZE = 65536
+BATCH_SIZE = 1024
+JOB_CHUNK_SIZE = 50000
+
+
+def tld_extractor(index=None, cache_size=CACHE_SIZE):
+    """Return a function computing the registered domain of a host, using
+    the offline PSL `index` if given or tldextract otherwise.
+
+    Results are memoized on the trailing labels of the host that decide it,
+    so that all the hosts of a registered domain share a cache entry."""
+    if index is not None:
+        extract = index.extract
+        rules = index
+    else:
+        # imported here so that offline runs don't pay for it
+        import tldextract
+        extract = tldextract.extract
+        try:
+            # every rule, private ones included, as they can only make the
+            # tail deeper
+            rules = PublicSuffixIndex(compile_rules(
+                tldextract.tldextract.TLD_EXTRACTOR._get_tld_extractor().tlds_incl_private))
+        except AttributeError:
+            rules = None
+
+    @lru_cache(maxsize=cache_size)
+    def extract_tld(tail):
+        ext = extract(tail)
         tld = f"{ext.domain}.{ext.suffix}"
         # remove eventual dot at the end of the TLD
         if tld.endswith("."):
             tld = tld[:-1]
-        tlds.append(tld)
-    return tlds
+        return tld
+
+    def extract_host(host):
+        host = netloc(host)
+        if not host.isascii():
+            host = host.translate(DOTS)
+        labels = host.split(".")
+        if labels[-1].isdecimal():
+            # IPv4 addresses are kept whole
+            return extract_tld(host)
+        depth = TAIL_LABELS if rules is None else rules.tail_depth(labels)
+        return extract_tld(".".join(labels[-depth:]))
+
+    return extract_host
+
+
+def iter_tlds(hosts, index=None, cache_size=CACHE_SIZE):
+    """Yield the registered domain of each host as soon as it is read"""
+    extract = tld_extractor(index, cache_size)
+    for host in hosts:
+        yield extract(host)
+
+
+def extract_tlds(hosts, index=None):
+    return list(iter_tlds(hosts, index))
+
+
+def unique_tlds(tlds):
+    """Yield each registered domain the first time it is seen"""
+    seen = set()
+    for tld in tlds:
+        if tld not in seen:
+            seen.add(tld)
+            yield tld
+
+
+def count_tlds(tlds):
+    """Return the exact count of each registered domain"""
+    return Counter(tlds)
+
+
+def top_tlds(tlds, k):
+    """Return the `k` most common registered domains with their exact counts"""
+    return count_tlds(tlds).most_common(k)
+
+
+class HyperLogLog:
+    """Approximate distinct counter using 2**precision one-byte registers
+    (standard error of about 1.04 / sqrt(2**precision))"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, item):
+        value = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+class SpaceSaving:
+    """Approximate heavy hitters keeping at most `capacity` counters.
+    Counts are overestimated by at most the count of the evicted counter
+    they took over, which is kept in `errors`."""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # min-heap of (count, item); entries may lag behind `counts`
+        self.heap = []
+
+    def add(self, item):
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+        elif len(counts) < self.capacity:
+            counts[item] = 1
+            self.errors[item] = 0
+            heapq.heappush(self.heap, (1, item))
+        else:
+            # evict the item with the smallest count
+            while True:
+                count, smallest = self.heap[0]
+                if counts[smallest] == count:
+                    break
+                heapq.heapreplace(self.heap, (counts[smallest], smallest))
+            del counts[smallest]
+            del self.errors[smallest]
+            counts[item] = count + 1
+            self.errors[item] = count
+            heapq.heapreplace(self.heap, (count + 1, item))
+
+    def most_common(self, k=None):
+        return Counter(self.counts).most_common(k)
+
+
+def approx_distinct_tlds(tlds, precision=14):
+    """Return an estimate of the number of distinct registered domains using
+    a HyperLogLog of 2**precision bytes"""
+    hll = HyperLogLog(precision)
+    for tld in tlds:
+        hll.add(tld)
+    return hll.count()
+
+
+def approx_top_tlds(tlds, k, capacity=10000):
+    """Return an estimate of the `k` most common registered domains with their
+    (over)estimated counts, using at most `capacity` counters"""
+    summary = SpaceSaving(max(capacity, k))
+    for tld in tlds:
+        summary.add(tld)
+    return summary.most_common(k)
+
+
+def init_worker(psl, use_index):
+    global worker_extract
+    worker_extract = tld_extractor(load_index(psl) if use_index else None)
+
+
+def extract_chunk(hosts):
+    """Worker task in --jobs mode"""
+    return [worker_extract(host) for host in hosts]
+
+
+def iter_tlds_parallel(hosts, jobs, psl=None, use_index=False, chunk_size=JOB_CHUNK_SIZE):
+    """Yield the registered domain of each host, in input order, processing
+    chunks of `chunk_size` hosts in a pool of `jobs` processes"""
+    hosts = iter(hosts)
+    chunks = iter(lambda: list(islice(hosts, chunk_size)), [])
+    with Pool(jobs, initializer=init_worker, initargs=(psl, use_index)) as pool:
+        for tlds in pool.imap(extract_chunk, chunks):
+            yield from tlds
+
+
+def write_lines(lines, out=sys.stdout, batch_size=BATCH_SIZE):
+    """Write lines in batches of `batch_size`, flushing after each batch.
+    Return the number of lines written."""
+    count = 0
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            out.write("\n".join(batch) + "\n")
+            out.flush()
+            count += len(batch)
+            batch = []
+    if batch:
+        out.write("\n".join(batch) + "\n")
+        out.flush()
+        count += len(batch)
+    return count
+
 
 if __name__ == "__main__":
-    if len(sys.argv) == 1:
+    parser = argparse.ArgumentParser(description="Extract registered domains from a list of hosts.")
+    parser.add_argument("file", nargs="?", help="Input file (default: read from stdin)")
+    parser.add_argument("--psl", metavar="FILE",
+                        help="Use this Public Suffix List file through the offline index")
+    parser.add_argument("--no-fetch", action="store_true",
+                        help="Never fetch the Public Suffix List, use the offline index of "
+                             "the snapshot bundled with tldextract")
+    parser.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE, metavar="N",
+                        help="Write results in batches of N lines (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="Process chunks of input in a pool of N processes, "
+                             "keeping the output order (default: %(default)s)")
+    aggregate = parser.add_mutually_exclusive_group()
+    aggregate.add_argument("-u", "--unique", action="store_true",
+                           help="Print each registered domain only once")
+    aggregate.add_argument("-d", "--distinct", action="store_true",
+                           help="Only print the number of distinct registered domains")
+    aggregate.add_argument("-c", "--count", action="store_true",
+                           help="Print the count of each registered domain, most common first")
+    aggregate.add_argument("-t", "--top", type=int, metavar="K",
+                           help="Print the K most common registered domains with their counts")
+    parser.add_argument("--approx", action="store_true",
+                        help="Use bounded-memory sketches for --distinct (HyperLogLog) "
+                             "and --top (Space-Saving)")
+    parser.add_argument("--precision", type=int, default=14, metavar="P",
+                        help="HyperLogLog precision, using 2**P bytes (default: %(default)s)")
+    parser.add_argument("--capacity", type=int, default=10000, metavar="N",
+                        help="Counters kept by Space-Saving (default: %(default)s)")
+    args = parser.parse_args()
+    if args.approx and not (args.distinct or args.top):
+        parser.error("--approx requires --distinct or --top")
+
+    use_index = bool(args.psl or args.no_fetch)
+    index = None
+    if use_index:
+        try:
+            index = load_index(args.psl)
+        except (PSLNotFound, OSError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    if args.file is None:
         # Read from stdin if no file argument is provided
-        hosts = sys.stdin.read().splitlines()
+        file = sys.stdin
     else:
         # Read from the file provided as an argument
-        file_path = sys.argv[1]
+        file_path = args.file
         try:
-            with open(file_path, 'r') as file:
-                hosts = file.read().splitlines()
+            file = open(file_path, 'r')
         except FileNotFoundError:
             print(f"Error: File '{file_path}' not found.")
             sys.exit(1)
 
-    tlds = extract_tlds(hosts)
+    with file:
+        hosts = (line.rstrip("\r\n") for line in file)
+        if args.jobs > 1:
+            tlds = iter_tlds_parallel(hosts, args.jobs, args.psl, use_index)
+        else:
+            tlds = iter_tlds(hosts, index)
 
-    if tlds:
-        for tld in tlds:
-            print(tld)
-    else:
+        if args.distinct:
+            if args.approx:
+                print(approx_distinct_tlds(tlds, args.precision))
+            else:
+                print(len(set(tlds)))
+            sys.exit(0)
+        if args.count or args.top:
+            if args.approx:
+                counts = approx_top_tlds(tlds, args.top, args.capacity)
+            else:
+                counts = count_tlds(tlds).most_common(args.top)
+            tlds = (f"{count} {tld}" for tld, count in counts)
+        elif args.unique:
+            tlds = unique_tlds(tlds)
+        count = write_lines(tlds, batch_size=args.batch_size)
+
+    if not count:
         print("No TLDs found in the provided hosts.")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Measure the ingestion throughput of inProfiles.py on a synthetic set of Burp
+exports of LinkedIn voyager API responses full of `included` profile entries,
+at several --jobs values.
+
+With --micro, measure instead the profiles/s of the name normalization and
+email inference hot path (parse_response() on already decoded responses),
+with its caches cleared before each run and kept warm, along with the calls/s
+of infer_email() and strip_accents().
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from inProfiles import (ItemFilter, VOYAGER_URL, email_candidates, infer_email, load_profiles, parse_response,
+                        profile_types, strip_accents)
+from common.walk import walk_files
+
+FIRST_NAMES = ["ana", "João", "maria", "Pedro", "José", "Élodie", "li", "Zoë", "carlos", "A."]
+LAST_NAMES = ["silva", "Souza", "de Oliveira", "dos Santos", "Müller", "O'Neil", "jr", "Van Der Berg", "Nguyễn"]
+SUFFIXES = ["", "", " (she/her)", " Jr.", " [PMP]"]
+
+HEAD = '<?xml version="1.0"?>\n<items burpVersion="2021.8.2">\n'
+ITEM = """  <item>
+    <url><![CDATA[https://www.linkedin.com/voyager/api/search/dash/clusters?start={start}]]></url>
+    <host ip="13.107.42.14">www.linkedin.com</host>
+    <method><![CDATA[GET]]></method>
+    <status>200</status>
+    <mimetype>JSON</mimetype>
+    <response base64="true"><![CDATA[{response}]]></response>
+  </item>
+"""
+
+
+def make_entry(rng):
+    """Return a random `included` entry, most of them profiles"""
+    kind = rng.choice(list(profile_types) + ["other"])
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES) + rng.choice(SUFFIXES)
+    public_id = f"{first.lower()}-{rng.randrange(10 ** 4)}"
+    if kind == "voyager_miniprofile":
+        return {"$type": profile_types[kind], "firstName": first, "lastName": last,
+                "occupation": rng.choice(["Engineer\nat X", "Analyst", ""]), "publicIdentifier": public_id}
+    if kind == "voyager_profile":
+        return {"$type": profile_types[kind], "firstName": first, "lastName": last,
+                "headline": rng.choice(["Head\nof things", None, "CTO"]), "publicIdentifier": public_id}
+    if kind == "voyager_entityresult":
+        return {"$type": profile_types[kind], "title": {"text": f"{first} {last}"},
+                "summary": {"text": "Current: Lead dev at Co\nmore"}}
+    return {"$type": "com.linkedin.voyager.common.Image", "url": "x"}
+
+
+def make_exports(root, files, items, entries, seed=0):
+    """Write `files` exports of `items` responses with `entries` entries each"""
+    rng = random.Random(seed)
+    for i in range(files):
+        with open(root / f"export{i}.xml", "w") as file:
+            file.write(HEAD)
+            for start in range(items):
+                body = json.dumps({"data": {}, "included": [make_entry(rng) for _ in range(entries)]})
+                response = "HTTP/2 200 OK\r\nContent-Type: application/json\r\n\r\n" + body
+                file.write(ITEM.format(start=start, response=base64.b64encode(response.encode()).decode()))
+            file.write("</items>\n")
+
+
+def best_of(function, repeat, setup=None):
+    """Return the shortest time of `repeat` calls of `function`"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def clear_caches():
+    strip_accents.cache_clear()
+    email_candidates.cache_clear()
+
+
+def micro(responses, entries, repeat):
+    """Print the throughput of the profile parsing hot path"""
+    rng = random.Random(0)
+    objs = [{"data": {}, "included": [make_entry(rng) for _ in range(entries)]} for _ in range(responses)]
+    profiles = sum(len(parse_response(obj, "example.com", "first.last,flast")) for obj in objs)
+    names = [(person["firstName"].lower(), person["fullName"].lower().split()[1:])
+             for obj in objs for person in parse_response(obj, "example.com", "first.last")]
+
+    def parse():
+        for obj in objs:
+            parse_response(obj, "example.com", "first.last,flast")
+
+    def infer():
+        for name, other_names in names:
+            infer_email(name, other_names, "example.com", "first.last,flast")
+
+    def strip():
+        for name, other_names in names:
+            strip_accents(name)
+            for other_name in other_names:
+                strip_accents(other_name)
+
+    strips = sum(1 + len(other_names) for _, other_names in names)
+    print(f"{responses} responses, {profiles} profiles, best of {repeat}")
+    for name, function, count, unit in [("parse_response", parse, profiles, "profiles"),
+                                        ("infer_email", infer, len(names), "calls"),
+                                        ("strip_accents", strip, strips, "calls")]:
+        for state, setup in [("cold", clear_caches), ("warm", None)]:
+            elapsed = best_of(function, repeat, setup)
+            print(f"  {name:<16} {state} {count / elapsed:>11.0f} {unit}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inProfiles.py ingestion")
+    parser.add_argument("--files", type=int, default=40, help="Exports to generate (default: %(default)s)")
+    parser.add_argument("--items", type=int, default=100, help="Responses per export (default: %(default)s)")
+    parser.add_argument("--entries", type=int, default=50,
+                        help="Included entries per response (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()],
+                        help="Worker counts to measure (default: 1 2 4 and the CPU count)")
+    parser.add_argument("--micro", action="store_true",
+                        help="Measure the profile parsing hot path instead of whole exports")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs of each --micro case, the best one being kept (default: %(default)s)")
+    args = parser.parse_args()
+    logging.disable()
+
+    if args.micro:
+        micro(args.items, args.entries, args.repeat)
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_exports(root, args.files, args.items, args.entries)
+        file_list = list(walk_files([root]))
+        size = sum(os.path.getsize(path) for path in file_list)
+        print(f"{len(file_list)} exports, {args.files * args.items} responses, {size / 2 ** 20:.1f} MiB")
+
+        expected = None
+        for jobs in dict.fromkeys(args.jobs):
+            start = time.perf_counter()
+            people = load_profiles(file_list, "example.com", "first.last,flast", ItemFilter(url=VOYAGER_URL), jobs)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = people
+            assert people == expected, f"--jobs {jobs} found different profiles"
+            print(f"  {f'--jobs {jobs}':<10} {elapsed:>7.2f} s {len(file_list) / elapsed:>7.1f} files/s "
+                  f"{len(people) / elapsed:>9.0f} profiles/s")
@@ -27,23 +27,55 @@ into CSV format, optionally inferring employees emails.
 
 import pandas as pd
 import argparse
-import json
 import logging
+import os
 import re
+import sqlite3
+import sys
 import unicodedata
-from base64 import b64decode
+from functools import lru_cache, partial
+from multiprocessing import Pool
 from pathlib import Path
-from defusedxml.ElementTree import parse
 from typing import List
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.burp import PARSE_ERRORS, ItemFilter, iter_items
+from common.jsonbackend import BACKENDS, get_backend
+from common.walk import SYMLINK_POLICIES, walk_files
+
 logging.basicConfig(level=logging.INFO)
 
-email_patterns = ['first.last', 'first', 'last', 'flast']
+# functions yielding the users of a pattern, given the first name and the
+# other names of a person
+EMAIL_PATTERNS = {
+        'first.last': lambda name, otherNames: (f'{name}.{surname}' for surname in otherNames),
+        'first': lambda name, otherNames: (name,),
+        'last': lambda name, otherNames: otherNames,
+        'flast': lambda name, otherNames: (f'{name[0]}{surname}' for surname in otherNames),
+        }
+email_patterns = list(EMAIL_PATTERNS)
 profile_types = {
         "voyager_miniprofile": "com.linkedin.voyager.identity.shared.MiniProfile",
         "voyager_profile": "com.linkedin.voyager.dash.identity.profile.Profile",
         "voyager_entityresult": "com.linkedin.voyager.dash.search.EntityResultViewModel"
         }
+# items whose responses are parsed by default
+VOYAGER_URL = "/voyager/api/"
+# JSON object of a response, found without decoding it
+JSON_BODY_RE = re.compile(rb'{.+}')
+# use regex to avoid garbage like (...) or [..] at the end of name
+# it won't work if name starts with something else
+NAME_RE = re.compile(r'^[^\[\]{}()\'"\-|]+')
+# undesirable characters in names
+NAME_PUNCTUATION = str.maketrans('', '', "._!,;")
+NAME_PARTICLES = ['de', 'da', 'do', 'das', 'dos']
+# names seen again and again across search pages are processed once
+STRIP_ACCENTS_CACHE = 4096
+EMAIL_CACHE = 16384
+# properties of the profiles kept in a --db store
+PROFILE_COLUMNS = "email,fullName,firstName,lastName,publicIdentifier,occupation,headline".split(",")
+# profiles read at a time from a --db store
+STORE_CHUNK = 10000
 
 
 class ParseError(Exception):
@@ -51,89 +83,7 @@ class ParseError(Exception):
     pass
 
 
-parser = argparse.ArgumentParser(description="Parse Burp's saved items from LinkedIn data")
-parser.add_argument(
-        "dir",
-        help="root directories",
-        nargs='+',
-        )
-parser.add_argument(
-        "-d",
-        "--domain",
-        required=True,
-        help="Domain name",
-        )
-parser.add_argument(
-        "-p",
-        "--pattern",
-        help=f"Comma-separated email patterns (default: %(default)s) (options: {','.join(email_patterns)})",
-        type=str,
-        default='first.last',
-        )
-parser.add_argument(
-        "-n",
-        "--dry-run",
-        dest="dryrun",
-        help="Only list the files that should be read",
-        action="store_true",
-        )
-parser.add_argument(
-        "-r",
-        "--recursive",
-        help="Recursively search for files starting from root directory",
-        action="store_true",
-        )
-parser.add_argument(
-        "-s",
-        "--silent",
-        help="Ommit logging messages",
-        action="store_true",
-        )
-parser.add_argument(
-        "--columns",
-        nargs='+',
-        help="Columns to write to output (default: %(default)s)",
-        dest="columns",
-        metavar="COLUMN",
-        default="email,fullName,firstName,lastName,publicIdentifier,occupation,headline".split(",")
-        )
-parser.add_argument(
-        "--drop-columns",
-        nargs='+',
-        help="Drop columns (properties) from result",
-        dest="dropc",
-        metavar="COLUMN",
-        )
-parser.add_argument(
-        "--sort-by",
-        nargs='+',
-        help="Sort result by columns",
-        dest="sortby",
-        metavar="COLUMN",
-        )
-parser.add_argument(
-        "--query",
-        type=str,
-        help="Apply query to filter final dataset",
-        )
-
-args = parser.parse_args()
-
-def search_files(directory, recursive=False):
-    dirpath = Path(directory)
-    assert dirpath.is_dir()
-    file_list = []
-    for x in dirpath.iterdir():
-        if x.is_file():
-            file_list.append(x)
-            logging.info("Found file %s", x)
-        else:
-            logging.info("Found directory %s", x)
-            if recursive:
-                file_list.extend(search_files(x))
-    return file_list
-
-
+@lru_cache(maxsize=STRIP_ACCENTS_CACHE)
 def strip_accents(text):
     """
     Strip accents from input String.
@@ -154,6 +104,25 @@ def strip_accents(text):
     return str(text)
 
 
+@lru_cache(maxsize=None)
+def compile_patterns(pattern: str) -> tuple:
+    """Return the functions of a comma-separated list of email patterns,
+    ignoring unknown ones"""
+    patterns = tuple(EMAIL_PATTERNS[p] for p in pattern.split(',') if p in EMAIL_PATTERNS)
+    if not patterns:
+        raise ValueError("Unexpected email pattern")
+    return patterns
+
+
+@lru_cache(maxsize=EMAIL_CACHE)
+def email_candidates(name: str, otherNames: tuple, domain: str, pattern: str) -> str:
+    user = [u for generate in compile_patterns(pattern) for u in generate(name, otherNames)]
+    # remove invalid chars from begining and end, then duplicates
+    user = dict.fromkeys(u.strip('.,;') for u in user)
+
+    return "|".join(strip_accents(u).strip('.').lower() + "@" + domain for u in user)
+
+
 def infer_email(name: str, otherNames: List[str], domain: str, pattern: str) -> str:
     """Infer a person's email based on name, surname/middlenames and pattern"""
     assert name is not None \
@@ -163,36 +132,14 @@ def infer_email(name: str, otherNames: List[str], domain: str, pattern: str) ->
     # if pattern != 'first':
     #     assert otherNames is not None \
     #         and len(otherNames) > 0
-    patterns = pattern.split(',')
-
-    if all(list(map(lambda x: x not in email_patterns, patterns))):
-        raise ValueError("Unexpected email pattern")
-    user = []
-    for pattern in patterns:
-        if pattern not in email_patterns:
-            continue
-        if pattern == 'first.last':
-            user.extend([f'{name}.{surname}' for surname in otherNames])
-        elif pattern == 'flast':
-            user.extend([f'{name[0]}{surname}' for surname in otherNames])
-        elif pattern == 'first':
-            user.append(name)
-        elif pattern == 'last':
-            user.extend(otherNames)
-
-    # remove invalid chars from begining and end
-    user = list(map(lambda x: x.strip('.,;'), user))
-    # remove duplicates
-    user = list(set(user))
+    return email_candidates(name, tuple(otherNames), domain, pattern)
 
-    emails = map(lambda x: strip_accents(x).strip('.').lower() + "@" + domain, user)
-    return ("|".join(list(emails)))
 
 
-
-def parse_profile(entry: dict, ptype: str, supported_types: dict) -> dict:
+def parse_profile(entry: dict, ptype: str, supported_types: dict, domain: str, pattern: str) -> dict:
     """Parse LinkedIn profile as found in JSON responses into
-    a dictionary containing only properties of interest"""
+    a new dictionary containing only properties of interest,
+    with emails inferred for `domain` following `pattern`"""
     if entry is None:
         raise ValueError(f"entry should not be None")
     if ptype not in supported_types.values():
@@ -204,10 +151,7 @@ def parse_profile(entry: dict, ptype: str, supported_types: dict) -> dict:
             raise ValueError(f"Full name not found for {ptype}")
         fullName = fullName.lower()
     else:
-        # use regex to avoid garbage like (...) or [..] at the end of name
-        # it won't work if name starts with something else
-        fullName = re.search(r'^[^\[\]{}()\'"\-|]+',
-                        entry.get('firstName', '') + ' ' + entry.get('lastName', ''))
+        fullName = NAME_RE.search(entry.get('firstName', '') + ' ' + entry.get('lastName', ''))
         if fullName is None:
             logging.warning("Could not parse full name from '%s'",
                     entry['firstName'] + ' ' + entry['lastName'])
@@ -215,11 +159,12 @@ def parse_profile(entry: dict, ptype: str, supported_types: dict) -> dict:
 
         fullName = fullName.group(0).lower()
 
+    person = {}
     # ignore anonymous linkedin member
     if fullName == "linkedin member":
         raise ParseError("Anonymous Linkedin Member")
     # remove undesirable characters
-    fullName = fullName.translate({ord(c): None for c in "._!,;"})
+    fullName = fullName.translate(NAME_PUNCTUATION)
     name_fields = fullName.split()
     # remove blank fields
     name_fields = [n for n in name_fields if n != '' and n != ' ']
@@ -237,7 +182,7 @@ def parse_profile(entry: dict, ptype: str, supported_types: dict) -> dict:
 
     otherNames = name_fields[1:]
     # remove some elements
-    for x in ['de', 'da', 'do', 'das', 'dos']:
+    for x in NAME_PARTICLES:
         if x in otherNames:
             otherNames.remove(x)
     # also, remove single letter names
@@ -261,7 +206,7 @@ def parse_profile(entry: dict, ptype: str, supported_types: dict) -> dict:
 
     try:
         person['email'] = infer_email(name_fields[0],
-                            otherNames, args.domain, args.pattern)
+                            otherNames, domain, pattern)
     except AssertionError:
         logging.warning("Could not infer email from '%s'", ' '.join(name_fields))
         person['email'] = ''
@@ -270,45 +215,55 @@ def parse_profile(entry: dict, ptype: str, supported_types: dict) -> dict:
     return person
 
 
+def read_items(file, item_filter=None):
+    """Yield the items of a Burp export accepted by the filter, logging an
+    error if the file cannot be parsed"""
+    try:
+        yield from iter_items(file, item_filter)
+    except PARSE_ERRORS as e:
+        logging.error("Unable to parse file %s as XML: %s", file, e)
 
-if (args.silent):
-    logging.disable()
-
-logging.info("Searching files starting from %s", args.dir)
-
-file_list = []
-for dir in args.dir:
-    file_list.extend(search_files(dir, args.recursive))
-
-if args.dryrun:
-    logging.info("Running in dry-run mode, so finishing here")
-    exit(0)
 
+def parse_response(obj: dict, domain: str, pattern: str) -> List[dict]:
+    """Return the profiles found in the `included` entries of a voyager
+    API response"""
+    people = []
+    for entry in obj['included']:
+        if '$type' not in entry.keys():
+            continue
+        if entry['$type'] not in profile_types.values():
+            continue
 
-people = []
-for file in file_list:
-    try:
-        et = parse(file)
-    except:
-        logging.error("Unable to parse file %s as XML", file)
-        continue
-
-    root = et.getroot()
-    if root.tag != 'items':
-        logging.error("Unexpected root element '%s'", root.tag)
-        continue
-
-    responses = root.findall(".//response")
-    for response in responses:
-        if response.attrib['base64']:
-            response.text = b64decode(response.text).decode('UTF-8')
-        body = re.search(r'{.+}', response.text)
+        # get profile information
+        try:
+            person = parse_profile(entry, entry['$type'], profile_types, domain, pattern)
+        except ValueError:
+            logging.error("Unsupported type %s", entry['$type'])
+            continue
+        except ParseError as e:
+            logging.error(e)
+            continue
+        else:
+            people.append(person)
+    return people
+
+
+def parse_file(path: str, domain: str, pattern: str, item_filter: ItemFilter = None,
+               json_backend: str = "auto") -> tuple:
+    """Return the path of a Burp export and the profiles found in the
+    responses of its items accepted by `item_filter`"""
+    backend = get_backend(json_backend)
+    people = []
+    for item in read_items(path, item_filter):
+        if item.response is None:
+            continue
+        body = JSON_BODY_RE.search(item.response)
         if body is None:
             logging.debug("JSON object not found on response body")
             continue
 
         try:
-            obj = json.loads(body.group(0))
+            obj = backend.loads(memoryview(item.response)[body.start():body.end()])
         except:
             logging.error("Unable to parse response body as JSON")
             continue
@@ -317,41 +272,319 @@ for file in file_list:
             logging.error("Key 'included' not found on JSON object")
             continue
 
-        for entry in obj['included']:
-            if '$type' not in entry.keys():
-                continue
-            if entry['$type'] not in profile_types.values():
-                continue
-
-            # get profile information
-            person = {}
-            try:
-                person = parse_profile(entry, entry['$type'], profile_types)
-            except ValueError:
-                logging.error("Unsupported type %s", entry['$type'])
-                continue
-            except ParseError as e:
-                logging.error(e)
-                continue
-            else:
-                people.append(person)
-
+        people.extend(parse_response(obj, domain, pattern))
+    return path, people
+
+
+def parse_files(file_list, domain: str, pattern: str, item_filter: ItemFilter = None, jobs: int = 1,
+                json_backend: str = "auto"):
+    """Yield parse_file() results in the order of `file_list`, using `jobs`
+    worker processes"""
+    parse = partial(parse_file, domain=domain, pattern=pattern, item_filter=item_filter, json_backend=json_backend)
+    if jobs == 1:
+        yield from map(parse, file_list)
+        return
+    # workers log at the same level as this process, even when not forked
+    with Pool(jobs, initializer=logging.disable, initargs=(logging.root.manager.disable,)) as pool:
+        yield from pool.imap(parse, file_list)
+
+
+def load_profiles(file_list, domain: str, pattern: str, item_filter: ItemFilter = None, jobs: int = 1,
+                  json_backend: str = "auto") -> List[dict]:
+    """Return the profiles found in a list of Burp exports, logging the
+    running count"""
+    people = []
+    for path, profiles in parse_files(file_list, domain, pattern, item_filter, jobs, json_backend):
+        people.extend(profiles)
         logging.info("Current profiles count: %d", len(people))
-# end of responses parsing
-
-if len(people) == 0:
-    logging.warning("No data was parsed. Verify if files in directory contains Burp items (XML files)")
-else:
-    result_df = pd.DataFrame(people)
-    logging.info("Content parsed. Removing duplicates...")
-    result_df.drop_duplicates(inplace=True)
-    if args.query:
-        logging.info("Applying query to dataset...")
-        result_df.query(args.query, inplace=True)
-    if args.sortby:
-        logging.info("Sorting data...")
-        result_df.sort_values(args.sortby, inplace=True)
-    if args.dropc:
-        logging.info("Dropping columns from result...")
-        result_df.drop(columns=args.dropc, inplace=True)
-    print(result_df.to_csv(index=False, columns=args.columns))
+    return people
+
+
+def profile_key(person: dict) -> str:
+    """Return the key profiles are deduplicated on in a store: their public
+    identifier, or their full name without accents, case and extra spaces"""
+    if person.get('publicIdentifier'):
+        return 'id:' + person['publicIdentifier']
+    return 'name:' + ' '.join(strip_accents(person['fullName']).lower().split())
+
+
+class ProfileStore:
+    """SQLite store of the profiles found in the exports ingested so far.
+
+    Profiles are upserted on profile_key(), the non-empty properties of the
+    latest one replacing those stored. Ingested files are recorded with their
+    size and mtime, so that later runs only parse new or changed exports.
+    A store holds the emails of a single domain and pattern."""
+
+    def __init__(self, path, domain: str, pattern: str):
+        self.db = sqlite3.connect(path)
+        columns = ", ".join(f'"{column}" TEXT' for column in PROFILE_COLUMNS)
+        self.db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, profiles INTEGER);
+            CREATE TABLE IF NOT EXISTS profiles (key TEXT PRIMARY KEY, {columns});
+            """)
+        for name, value in [("domain", domain), ("pattern", pattern)]:
+            self.db.execute("INSERT OR IGNORE INTO settings VALUES (?, ?)", (name, value))
+            stored, = self.db.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+            if stored != value:
+                raise ValueError(f"{path} holds profiles for {name} {stored!r}, not {value!r}")
+        self.db.commit()
+        placeholders = ", ".join("?" * (len(PROFILE_COLUMNS) + 1))
+        updates = ", ".join(f'"{column}" = COALESCE(NULLIF(excluded."{column}", \'\'), "{column}")'
+                            for column in PROFILE_COLUMNS)
+        self.upsert = (f"INSERT INTO profiles VALUES ({placeholders}) "
+                       f"ON CONFLICT (key) DO UPDATE SET {updates}")
+
+    @staticmethod
+    def fingerprint(path) -> tuple:
+        stat = os.stat(path)
+        return str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns
+
+    def is_ingested(self, path) -> bool:
+        key, size, mtime = self.fingerprint(path)
+        row = self.db.execute("SELECT size, mtime FROM files WHERE path = ?", (key,)).fetchone()
+        return row == (size, mtime)
+
+    def add(self, path, people: List[dict]):
+        """Upsert the profiles of a file and record it as ingested"""
+        with self.db:
+            self.db.executemany(self.upsert, ([profile_key(person)] + [person.get(column) for column in PROFILE_COLUMNS]
+                                              for person in people))
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                            (*self.fingerprint(path), len(people)))
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def iter_frames(self, sortby: List[str] = None, chunksize: int = STORE_CHUNK):
+        """Yield the stored profiles as DataFrames of `chunksize` rows, sorted
+        by the `sortby` columns (empty values last) through an index"""
+        order = "rowid"
+        if sortby:
+            unknown = [column for column in sortby if column not in PROFILE_COLUMNS]
+            if unknown:
+                raise ValueError(f"Unknown columns {', '.join(unknown)}")
+            columns = ", ".join(f'"{column}"' for column in sortby)
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS "profiles_by_{"_".join(sortby)}" ON profiles ({columns})')
+            order = ", ".join(f'"{column}" NULLS LAST' for column in sortby) + ", rowid"
+        columns = ", ".join(f'"{column}"' for column in PROFILE_COLUMNS)
+        cursor = self.db.execute(f"SELECT {columns} FROM profiles ORDER BY {order}")
+        while rows := cursor.fetchmany(chunksize):
+            yield pd.DataFrame.from_records(rows, columns=PROFILE_COLUMNS)
+
+    def close(self):
+        self.db.close()
+
+
+def ingest(store: ProfileStore, file_list, domain: str, pattern: str, item_filter: ItemFilter = None,
+           jobs: int = 1, json_backend: str = "auto"):
+    """Parse the files of `file_list` not ingested yet into `store`"""
+    new_files = [path for path in file_list if not store.is_ingested(path)]
+    logging.info("%d new or changed files to ingest", len(new_files))
+    for path, profiles in parse_files(new_files, domain, pattern, item_filter, jobs, json_backend):
+        store.add(path, profiles)
+        logging.info("Ingested %d profiles from %s", len(profiles), path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse Burp's saved items from LinkedIn data")
+    parser.add_argument(
+            "dir",
+            help="root directories",
+            nargs='+',
+            )
+    parser.add_argument(
+            "-d",
+            "--domain",
+            required=True,
+            help="Domain name",
+            )
+    parser.add_argument(
+            "-p",
+            "--pattern",
+            help=f"Comma-separated email patterns (default: %(default)s) (options: {','.join(email_patterns)})",
+            type=str,
+            default='first.last',
+            )
+    parser.add_argument(
+            "-n",
+            "--dry-run",
+            dest="dryrun",
+            help="Only list the files that should be read",
+            action="store_true",
+            )
+    parser.add_argument(
+            "-r",
+            "--recursive",
+            help="Recursively search for files starting from root directory",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--max-depth",
+            dest="maxdepth",
+            type=int,
+            help="Levels of subdirectories to search with --recursive (default: no limit)",
+            metavar="N",
+            )
+    parser.add_argument(
+            "--include",
+            action="append",
+            help="Only read files whose name or path match this glob (can be repeated)",
+            metavar="GLOB",
+            )
+    parser.add_argument(
+            "--exclude",
+            action="append",
+            help="Skip files and directories whose name or path match this glob (can be repeated)",
+            metavar="GLOB",
+            )
+    parser.add_argument(
+            "--symlinks",
+            choices=SYMLINK_POLICIES,
+            default="follow",
+            help="Follow all symbolic links, only those to files, or none (default: %(default)s)",
+            )
+    parser.add_argument(
+            "--walk-threads",
+            dest="walkthreads",
+            type=int,
+            default=1,
+            help="Threads listing subdirectories ahead (default: %(default)s)",
+            metavar="N",
+            )
+    parser.add_argument(
+            "--url",
+            help="Only read items whose URL matches this regular expression (default: %(default)s)",
+            default=VOYAGER_URL,
+            metavar="REGEX",
+            )
+    parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="Parse files in a pool of N processes (default: %(default)s)",
+            metavar="N",
+            )
+    parser.add_argument(
+            "--json-backend",
+            dest="jsonbackend",
+            choices=BACKENDS,
+            default="auto",
+            help="Library decoding JSON, auto picking the fastest installed (default: %(default)s)",
+            )
+    parser.add_argument(
+            "-s",
+            "--silent",
+            help="Ommit logging messages",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--columns",
+            nargs='+',
+            help="Columns to write to output (default: %(default)s)",
+            dest="columns",
+            metavar="COLUMN",
+            default="email,fullName,firstName,lastName,publicIdentifier,occupation,headline".split(",")
+            )
+    parser.add_argument(
+            "--drop-columns",
+            nargs='+',
+            help="Drop columns (properties) from result",
+            dest="dropc",
+            metavar="COLUMN",
+            )
+    parser.add_argument(
+            "--sort-by",
+            nargs='+',
+            help="Sort result by columns",
+            dest="sortby",
+            metavar="COLUMN",
+            )
+    parser.add_argument(
+            "--query",
+            type=str,
+            help="Apply query to filter final dataset",
+            )
+    parser.add_argument(
+            "--db",
+            help="SQLite store to add the profiles of new exports to, and to write the result from",
+            metavar="FILE",
+            )
+
+    args = parser.parse_args()
+
+    if (args.silent):
+        logging.disable()
+
+    logging.info("Searching files starting from %s", args.dir)
+
+    file_list = walk_files(
+            args.dir,
+            max_depth=args.maxdepth if args.recursive else 0,
+            include=args.include,
+            exclude=args.exclude,
+            symlinks=args.symlinks,
+            threads=args.walkthreads,
+            onerror=lambda e: logging.error("Unable to list directory: %s", e),
+            )
+
+    if args.dryrun:
+        for file in file_list:
+            logging.info("Found file %s", file)
+        logging.info("Running in dry-run mode, so finishing here")
+        exit(0)
+
+
+    try:
+        item_filter = ItemFilter(url=args.url)
+    except re.error as e:
+        parser.error(f"invalid --url: {e}")
+    try:
+        get_backend(args.jsonbackend)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.db:
+        try:
+            store = ProfileStore(args.db, args.domain, args.pattern)
+        except (sqlite3.Error, ValueError) as e:
+            parser.error(f"unable to use --db: {e}")
+        try:
+            ingest(store, file_list, args.domain, args.pattern, item_filter, args.jobs, args.jsonbackend)
+            if store.count() == 0:
+                logging.warning("No data was parsed. Verify if files in directory contains Burp items (XML files)")
+                exit(0)
+            logging.info("Writing %d profiles from %s...", store.count(), args.db)
+            for i, result_df in enumerate(store.iter_frames(args.sortby)):
+                if args.query:
+                    result_df.query(args.query, inplace=True)
+                if args.dropc:
+                    result_df.drop(columns=args.dropc, inplace=True)
+                sys.stdout.write(result_df.to_csv(index=False, columns=args.columns, header=i == 0))
+            print()
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            store.close()
+        exit(0)
+
+    people = load_profiles(file_list, args.domain, args.pattern, item_filter, args.jobs, args.jsonbackend)
+
+    if len(people) == 0:
+        logging.warning("No data was parsed. Verify if files in directory contains Burp items (XML files)")
+    else:
+        result_df = pd.DataFrame(people)
+        logging.info("Content parsed. Removing duplicates...")
+        result_df.drop_duplicates(inplace=True)
+        if args.query:
+            logging.info("Applying query to dataset...")
+            result_df.query(args.query, inplace=True)
+        if args.sortby:
+            logging.info("Sorting data...")
+            result_df.sort_values(args.sortby, inplace=True)
+        if args.dropc:
+            logging.info("Dropping columns from result...")
+            result_df.drop(columns=args.dropc, inplace=True)
+        print(result_df.to_csv(index=False, columns=args.columns))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Measure the file ingestion throughput of parseJSONFromDir.py on a synthetic
+directory tree of JSON dumps, comparing one DataFrame per file followed by
+pd.concat() with the columnar loader at several --jobs values.
+
+With --pushdown, measure instead the wall time and peak memory of --query and
+--columns applied after loading every column of every row, and pushed down to
+parsing, on objects with many properties.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from parseJSONFromDir import ColumnTypes, Query, iter_json_array, load_files, load_reduced
+from common.walk import walk_files
+
+WIDE_QUERY = "p0 > 900"
+WIDE_COLUMNS = ["p1", "p2"]
+
+
+def make_tree(root, files, rows, seed=0):
+    """Write `files` files of `rows` objects each, spread over subdirectories"""
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = root / f"dir{i % 50}"
+        directory.mkdir(exist_ok=True)
+        objs = [{"id": rng.randrange(10 ** 6),
+                 "name": f"user{rng.randrange(10 ** 4)}",
+                 "email": f"user{rng.randrange(10 ** 4)}@example.com",
+                 "active": rng.random() < 0.5,
+                 "score": rng.random() * 100,
+                 "tags": rng.sample(["a", "b", "c", "d"], 2),
+                 # some properties appear only in part of the objects
+                 **({"extra": rng.randrange(100)} if rng.random() < 0.2 else {})}
+                for _ in range(rows)]
+        text = json.dumps(objs)
+        (directory / f"resp{i}.txt").write_text(f"HTTP/1.1 200 OK\r\n\r\n{text}")
+
+
+def make_wide_tree(root, files, rows, properties, seed=0):
+    """Write files of objects with `properties` integer properties"""
+    rng = random.Random(seed)
+    for i in range(files):
+        objs = [{f"p{j}": rng.randrange(1000) for j in range(properties)} for _ in range(rows)]
+        (root / f"resp{i}.txt").write_text(json.dumps(objs))
+
+
+def run_wide(mode, root):
+    """Compute the --query/--columns result of a wide tree in `mode` and
+    print the elapsed time and peak memory of this process"""
+    file_list = list(walk_files([root]))
+    start = time.perf_counter()
+    if mode == "after":
+        df = load_files(file_list)
+        df = df.drop_duplicates().query(WIDE_QUERY)[WIDE_COLUMNS]
+    else:
+        df = load_reduced(file_list, ColumnTypes(), query=Query(WIDE_QUERY), columns=WIDE_COLUMNS)
+        df = df.drop_duplicates()[WIDE_COLUMNS]
+    elapsed = time.perf_counter() - start
+    print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(df))
+
+
+def load_per_file(file_list):
+    """Reference: one DataFrame per file, then a concat of all of them"""
+    dfs = []
+    for path in file_list:
+        with open(path) as file:
+            dfs.append(pd.DataFrame.from_dict(list(iter_json_array(file))))
+    return pd.concat(dfs, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parseJSONFromDir.py file ingestion")
+    parser.add_argument("--files", type=int, default=5000, help="Files to generate (default: %(default)s)")
+    parser.add_argument("--rows", type=int, default=50, help="Objects per file (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()],
+                        help="Worker counts to measure (default: 1 2 4 and the CPU count)")
+    parser.add_argument("--pushdown", action="store_true",
+                        help="Compare filtering after loading and while parsing on wide objects")
+    parser.add_argument("--properties", type=int, default=200,
+                        help="Properties per object with --pushdown (default: %(default)s)")
+    parser.add_argument("--run-wide", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.disable()
+
+    if args.run_wide:
+        run_wide(*args.run_wide)
+        sys.exit()
+
+    if args.pushdown:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_wide_tree(Path(tmp), args.files, args.rows, args.properties)
+            print(f"{args.files} files, {args.files * args.rows} rows of {args.properties} properties, "
+                  f"--query {WIDE_QUERY!r} --columns {' '.join(WIDE_COLUMNS)}")
+            for mode, name in [("after", "after concat"), ("pushdown", "pushdown")]:
+                # a fresh process for each, so that peak memory is its own
+                output = subprocess.run([sys.executable, __file__, "--run-wide", mode, tmp],
+                                        capture_output=True, text=True, check=True).stdout
+                elapsed, maxrss, rows = output.split()
+                print(f"  {name:<16} {float(elapsed):>7.2f} s {int(maxrss) / 1024:>8.0f} MiB peak, {rows} rows")
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, args.files, args.rows)
+        file_list = list(walk_files([root]))
+        size = sum(os.path.getsize(path) for path in file_list)
+        print(f"{len(file_list)} files, {args.files * args.rows} rows, {size / 2 ** 20:.1f} MiB")
+
+        start = time.perf_counter()
+        expected = load_per_file(file_list)
+        elapsed = time.perf_counter() - start
+        print(f"  {'per-file concat':<16} {elapsed:>7.2f} s {len(file_list) / elapsed:>9.0f} files/s")
+        for jobs in dict.fromkeys(args.jobs):
+            start = time.perf_counter()
+            df = load_files(file_list, jobs)
+            elapsed = time.perf_counter() - start
+            pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+            print(f"  {f'--jobs {jobs}':<16} {elapsed:>7.2f} s {len(file_list) / elapsed:>9.0f} files/s")
@@ -23,125 +23,1165 @@
 
 import pandas as pd
 import argparse
+import ast
+import hashlib
+import heapq
 import json
 import logging
+import math
+import os
+import pickle
 import re
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from contextlib import nullcontext
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from operator import itemgetter
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.jsonbackend import BACKENDS, get_backend
+from common.walk import SYMLINK_POLICIES, walk_files
+
 logging.basicConfig(level=logging.INFO)
 
-parser = argparse.ArgumentParser(description="Parse JSON lists from files inside a directory")
-parser.add_argument(
-        "dir",
-        help="root directories",
-        nargs='+',
-        )
-parser.add_argument(
-        "-n",
-        "--dry-run",
-        dest="dryrun",
-        help="Only list the files that should be read",
-        action="store_true",
-        )
-parser.add_argument(
-        "-r",
-        "--recursive",
-        help="Recursively search for files starting from root directory",
-        action="store_true",
-        )
-parser.add_argument(
-        "-s",
-        "--silent",
-        help="Ommit logging messages",
-        action="store_true",
-        )
-parser.add_argument(
-        "--columns",
-        nargs='+',
-        help="Columns to write to output",
-        dest="columns",
-        metavar="COLUMN"
-        )
-parser.add_argument(
-        "--drop-columns",
-        nargs='+',
-        help="Drop columns (properties) from result",
-        dest="dropc",
-        metavar="COLUMN",
-        )
-parser.add_argument(
-        "--sort-by",
-        nargs='+',
-        help="Sort result by columns",
-        dest="sortby",
-        metavar="COLUMN",
-        )
-parser.add_argument(
-        "--query",
-        type=str,
-        help="Apply query to filter final dataset",
-        )
-
-args = parser.parse_args()
-
-def search_files(directory, recursive=False):
-    dirpath = Path(directory)
-    assert dirpath.is_dir()
-    file_list = []
-    for x in dirpath.iterdir():
-        if x.is_file():
-            file_list.append(x)
-            logging.info("Found file %s", x)
+# characters read from each file at a time
+CHUNK_SIZE = 1 << 20
+# bytes of the largest file decoded at once by a fast JSON backend, bigger
+# ones being streamed
+WHOLE_FILE_LIMIT = 64 << 20
+# rows filtered by --query at a time
+BATCH_SIZE = 10000
+# rows converted and written at a time
+WRITE_BATCH = 10000
+# output formats, and those guessed from the extension of --output
+FORMATS = ("csv", "jsonl", "parquet", "feather")
+FORMAT_SUFFIXES = {
+        ".csv": "csv",
+        ".jsonl": "jsonl",
+        ".ndjson": "jsonl",
+        ".parquet": "parquet",
+        ".feather": "feather",
+        ".arrow": "feather",
+        }
+# files looked up in the cache at a time, as they are found
+FILE_BLOCK = 10000
+# files handed to a worker at a time when running with --jobs
+JOB_CHUNK_SIZE = 4
+# bump whenever the layout of the cache changes, or the values parsed (2:
+# orjson no longer reads integers beyond 64 bits as floats)
+CACHE_VERSION = 2
+# default bound of the space taken by cached shards, in MiB
+CACHE_SIZE = 1024
+# rows loaded as Python objects take many times the size of their JSON text
+EXPANSION = 16
+# and about this many times their size once pickled to a partition
+PARTITION_EXPANSION = 5
+# bound of the number of temporary files open at once with --memory-limit
+MAX_PARTITIONS = 256
+BACKTICK_RE = re.compile(r"`([^`]*)`")
+LOCAL_RE = re.compile(r"@\w+")
+NUMBER_CHARS = frozenset("0123456789.eE+-")
+WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Yield the elements of the first JSON array found in a text file, one at
+    a time, without reading the whole file into memory.
+
+    Raise ValueError if the array is not valid JSON."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    def refill(pos, size=chunk_size):
+        """Drop the consumed part of the buffer and read the next chunk.
+        Return the position of `pos` in the new buffer."""
+        nonlocal buffer, eof
+        data = file.read(size)
+        eof = not data
+        buffer = buffer[pos:] + data
+        return 0
+
+    # look for the opening bracket, skipping whatever comes before it
+    while (pos := buffer.find("[")) == -1:
+        refill(len(buffer))
+        if eof:
+            return
+    pos += 1
+    # ']' is allowed right after '[' or after a value, ',' only after a value
+    after_value = False
+    allow_end = True
+    while True:
+        pos = skip_whitespace(buffer, pos)
+        if pos == len(buffer):
+            pos = refill(pos)
+            if eof:
+                raise ValueError("Unexpected end of file inside JSON array")
+            continue
+        char = buffer[pos]
+        if char == "]" and allow_end:
+            return
+        if after_value:
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' but found '{char}'")
+            pos += 1
+            after_value = allow_end = False
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+            # a number cut by the end of the buffer may continue in the next
+            # chunk ("-2." decodes as -2), other values end with a delimiter
+            complete = eof or end < len(buffer) and not (
+                isinstance(obj, (int, float)) and buffer[end] in NUMBER_CHARS)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(str(e))
+            complete = False
+        if not complete:
+            # grow the read size with the pending value so that a huge object
+            # is not decoded from scratch once per chunk
+            pos = refill(pos, max(chunk_size, len(buffer) - pos))
+            continue
+        yield obj
+        pos = end
+        after_value = allow_end = True
+
+
+def skip_whitespace(text, pos):
+    while pos < len(text) and text[pos] in WHITESPACE:
+        pos += 1
+    return pos
+
+
+class Columns:
+    """Rows stored column by column: a dict mapping each property to the
+    list of its values, with None where a row lacks the property.
+
+    Columns are kept in order of first appearance, like pd.concat() does
+    with DataFrames of different columns. Properties are skipped when they
+    are not in `include` (if given) or are in `exclude`."""
+
+    def __init__(self, include=None, exclude=()):
+        self.data = {}
+        self.rows = 0
+        self.include = include
+        self.exclude = exclude
+
+    def append(self, obj):
+        if isinstance(obj, list):
+            obj = dict(enumerate(obj))
+        elif not isinstance(obj, dict):
+            obj = {0: obj}
+        if self.include is not None or self.exclude:
+            obj = project(obj, self.include, self.exclude)
+        data = self.data
+        rows = self.rows
+        for key, value in obj.items():
+            column = data.get(key)
+            if column is None:
+                column = data[key] = [None] * rows
+            column.append(value)
+        self.rows = rows = rows + 1
+        if len(obj) < len(data):
+            self._pad(rows)
+
+    def extend(self, data, rows):
+        """Append `rows` rows given as a dict of equally long lists"""
+        for key, values in data.items():
+            column = self.data.get(key)
+            if column is None:
+                self.data[key] = [None] * self.rows + values
+            else:
+                column.extend(values)
+        self.rows += rows
+        if len(data) < len(self.data):
+            self._pad(self.rows)
+
+    def _pad(self, rows):
+        for column in self.data.values():
+            if len(column) < rows:
+                column.extend([None] * (rows - len(column)))
+
+    def to_frame(self):
+        return pd.DataFrame(self.data, columns=list(self.data))
+
+
+def project(data, include=None, exclude=()):
+    """Keep the items of a dict whose key is in `include` (if given) and
+    not in `exclude`"""
+    if include is not None:
+        return {key: value for key, value in data.items() if key in include}
+    if exclude:
+        return {key: value for key, value in data.items() if key not in exclude}
+    return data
+
+
+def load_json_array(path, json_backend="auto"):
+    """Return the elements of the first JSON array of a file, decoded at once
+    from its bytes by `json_backend`.
+
+    Return None when the file should be streamed by iter_json_array()
+    instead: with the standard library backend, for files bigger than
+    WHOLE_FILE_LIMIT, and when the array is followed by other data or is
+    invalid (so that errors are reported the same way)."""
+    backend = get_backend(json_backend)
+    if backend.name == "json" or os.path.getsize(path) > WHOLE_FILE_LIMIT:
+        return None
+    with open(path, "rb") as file:
+        data = file.read()
+    start = data.find(b"[")
+    if start == -1:
+        return []
+    try:
+        return backend.loads(memoryview(data)[start:])
+    except ValueError:
+        return None
+
+
+def parse_file(path, include=None, exclude=(), json_backend="auto"):
+    """Parse the first JSON array of a file into columns, keeping only the
+    properties selected by `include` and `exclude`.
+
+    Return (path, data, rows, error), `data` being a dict of lists so that
+    results are cheap to send back from a worker process."""
+    columns = Columns(include, exclude)
+    try:
+        objs = load_json_array(path, json_backend)
+        if objs is not None:
+            for obj in objs:
+                columns.append(obj)
         else:
-            logging.info("Found directory %s", x)
-            if recursive:
-                file_list.extend(search_files(x))
-    return file_list
+            with open(path) as file:
+                for obj in iter_json_array(file):
+                    columns.append(obj)
+    except (OSError, ValueError) as e:
+        return path, None, 0, str(e)
+    return path, columns.data, columns.rows, None
 
 
-if (args.silent):
-    logging.disable()
+def parse_files(file_list, jobs=1, include=None, exclude=(), json_backend="auto"):
+    """Yield parse_file() results in the order of `file_list`, using `jobs`
+    worker processes"""
+    parse = partial(parse_file, include=include, exclude=exclude, json_backend=json_backend)
+    if jobs == 1:
+        yield from map(parse, file_list)
+        return
+    with Pool(jobs) as pool:
+        yield from pool.imap(parse, file_list, JOB_CHUNK_SIZE)
 
-logging.info("Searching files starting from %s", args.dir)
 
-file_list = []
-for dir in args.dir:
-    file_list.extend(search_files(dir, args.recursive))
+def default_cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "utils" / "parseJSONFromDir"
 
-if args.dryrun:
-    logging.info("Running in dry-run mode, so finishing here")
-    exit(0)
 
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while data := file.read(CHUNK_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
 
-df_list = []
-row_count = 0
-for file in file_list:
-    content = file.read_text()
-    body = re.search(r'(\[.*\])', content)
-    if body:
+
+class ParseCache:
+    """On-disk cache of parse_file() results.
+
+    A JSON manifest maps the resolved path of every parsed file to its size,
+    mtime and optionally its content hash, along with the name of the pickle
+    shard holding its columns. Files whose fingerprint did not change are not
+    parsed again, and their shard is only read when its rows are needed.
+
+    Shards never take more than `max_size` bytes: making room for a new one
+    evicts the least recently used shards among those not used by this run,
+    and once there are none left, files are no longer cached."""
+
+    def __init__(self, directory=None, max_size=CACHE_SIZE << 20, use_hash=False, rebuild=False,
+                 json_backend="auto"):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        # used to parse new or changed files
+        self.json_backend = json_backend
+        self.manifest = self.directory / "manifest.json"
+        self.max_size = max_size
+        self.use_hash = use_hash
+        self.entries = {}
+        # fingerprints of the files to parse, taken before parsing them
+        self.pending = {}
+        if rebuild:
+            for shard in self.directory.glob("*.pickle"):
+                shard.unlink()
+        else:
+            self.entries = self.read_manifest()
+        self.size = sum(entry.get("shard_size", 0) for entry in self.entries.values())
+        # entries used before this run, least recently used first, built
+        # when room is first needed
+        self.started = time.time()
+        self.evictable = None
+        self.full = False
+
+    def read_manifest(self):
         try:
-            obj = json.loads(body.group(0))
-        except:
-            logging.error("Unable to parse content from %s as JSON: %s", file, body.group(0))
+            with open(self.manifest) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != CACHE_VERSION:
+            return {}
+        return manifest["entries"]
+
+    def remove(self, key):
+        """Drop the entry of a file and its shard"""
+        entry = self.entries.pop(key)
+        if "shard" in entry:
+            (self.directory / entry["shard"]).unlink(missing_ok=True)
+            self.size -= entry.get("shard_size", 0)
+
+    def make_room(self, size):
+        """Evict shards not used by this run until `size` more bytes fit in
+        the budget. Return whether they do."""
+        if self.evictable is None:
+            self.evictable = sorted((key for key, entry in self.entries.items()
+                                     if "shard" in entry and entry["used"] < self.started),
+                                    key=lambda key: self.entries[key]["used"], reverse=True)
+        while self.size + size > self.max_size and self.evictable:
+            key = self.evictable.pop()
+            entry = self.entries.get(key)
+            # skip files looked up or parsed again since
+            if entry is not None and entry["used"] < self.started:
+                self.remove(key)
+        return self.size + size <= self.max_size
+
+    def save(self):
+        """Evict old shards if needed and write the manifest"""
+        for key in sorted(self.entries, key=lambda key: self.entries[key]["used"]):
+            if self.size <= self.max_size:
+                break
+            self.remove(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.manifest.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, "w") as file:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, file)
+            os.replace(tmp_file, self.manifest)
+        except OSError as e:
+            logging.warning("Unable to write cache manifest %s: %s", self.manifest, e)
+
+    def fingerprint(self, path):
+        stat = os.stat(path)
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if self.use_hash:
+            fingerprint["hash"] = file_hash(path)
+        return fingerprint
+
+    def lookup(self, path):
+        """Return the entry of a file if its cached result is still valid"""
+        key = str(Path(path).resolve())
+        try:
+            fingerprint = self.fingerprint(path)
+        except OSError:
+            # gone since it was listed, parse_file() reports it
+            return None
+        entry = self.entries.get(key)
+        if entry is not None and entry["size"] == fingerprint["size"]:
+            if self.use_hash:
+                # a matching hash makes a changed mtime (touch, copy) irrelevant
+                valid = entry.get("hash") == fingerprint["hash"]
+            else:
+                valid = entry["mtime"] == fingerprint["mtime"]
+            if valid:
+                entry.update(fingerprint, used=time.time())
+                return entry
+        self.pending[key] = fingerprint
+        return None
+
+    def load(self, path, entry):
+        """Return the cached parse_file() result of a file, parsing it again
+        if its shard is gone"""
+        if "error" in entry:
+            return path, None, 0, entry["error"]
+        try:
+            with open(self.directory / entry["shard"], "rb") as file:
+                data, rows = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return self.store(*parse_file(path, json_backend=self.json_backend))
+        return path, data, rows, None
+
+    def store(self, path, data, rows, error):
+        """Record a parse_file() result if it fits in the cache, and return
+        it"""
+        key = str(Path(path).resolve())
+        fingerprint = self.pending.pop(key, None)
+        if key in self.entries:
+            self.remove(key)
+        if fingerprint is None:
+            try:
+                fingerprint = self.fingerprint(path)
+            except OSError:
+                return path, data, rows, error
+        entry = dict(fingerprint, used=time.time())
+        if error is not None:
+            entry["error"] = error
+        else:
+            if self.full:
+                return path, data, rows, error
+            payload = pickle.dumps((data, rows), protocol=pickle.HIGHEST_PROTOCOL)
+            if len(payload) > self.max_size:
+                # too big for the cache on its own
+                return path, data, rows, error
+            if not self.make_room(len(payload)):
+                logging.info("Cache is full (%d MiB), not caching further files", self.max_size >> 20)
+                self.full = True
+                return path, data, rows, error
+            entry["shard"] = hashlib.sha1(key.encode()).hexdigest() + ".pickle"
+            entry["shard_size"] = len(payload)
+            shard = self.directory / entry["shard"]
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_file = shard.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_file, "wb") as file:
+                    file.write(payload)
+                os.replace(tmp_file, shard)
+            except OSError as e:
+                logging.warning("Unable to cache %s: %s", path, e)
+                return path, data, rows, error
+            self.size += len(payload)
+        self.entries[key] = entry
+        return path, data, rows, error
+
+    def results(self, file_list, jobs=1):
+        """Yield parse_file() results in the order of `file_list`, parsing
+        only new or changed files. Files are looked up by blocks, so that
+        parsing starts before `file_list` is exhausted. A file listed more
+        than once in a block (overlapping roots) is parsed once."""
+        files = iter(file_list)
+        cached = parsed = 0
+        while block := list(islice(files, FILE_BLOCK)):
+            entries = [self.lookup(path) for path in block]
+            keys = [str(Path(path).resolve()) for path in block]
+            stale = {}
+            for path, key, entry in zip(block, keys, entries):
+                if entry is None:
+                    stale.setdefault(key, path)
+            cached += len(block) - len(stale)
+            parsed += len(stale)
+            results = parse_files(list(stale.values()), jobs, json_backend=self.json_backend)
+            # results of the stale files listed again further in the block
+            remaining = Counter(key for key, entry in zip(keys, entries) if entry is None)
+            duplicates = {}
+            for path, key, entry in zip(block, keys, entries):
+                if entry is not None:
+                    yield self.load(path, entry)
+                    continue
+                remaining[key] -= 1
+                if key in duplicates:
+                    _, data, rows, error = duplicates.pop(key) if remaining[key] == 0 else duplicates[key]
+                    yield path, data, rows, error
+                    continue
+                result = self.store(*next(results))
+                if remaining[key]:
+                    duplicates[key] = result
+                yield result
+        logging.info("%d files read from cache, %d parsed", cached, parsed)
+        self.save()
+
+
+def iter_results(file_list, jobs=1, cache=None, include=None, exclude=(), json_backend="auto"):
+    """Yield (path, data, rows) for each file parsed successfully, logging
+    errors and the running row count. Results are read from and saved to
+    `cache` if given. Otherwise only the columns selected by `include` and
+    `exclude` are parsed, the cache needing all of them."""
+    if cache is None:
+        results = parse_files(file_list, jobs, include, exclude, json_backend)
+    else:
+        results = cache.results(file_list, jobs)
+    row_count = 0
+    for path, data, rows, error in results:
+        if error is not None:
+            logging.error("Unable to parse content from %s as JSON: %s", path, error)
+            continue
+        row_count += rows
+        logging.info("Current row count: %d", row_count)
+        yield path, data, rows
+
+
+def load_files(file_list, jobs=1, cache=None, json_backend="auto"):
+    """Parse all files into a single DataFrame, or return None if no rows
+    were found"""
+    columns = Columns()
+    for path, data, rows in iter_results(file_list, jobs, cache, json_backend=json_backend):
+        columns.extend(data, rows)
+    if columns.rows == 0:
+        return None
+    return columns.to_frame()
+
+
+def query_columns(expr):
+    """Return the names of the columns a --query expression refers to, or
+    None if the expression cannot be analysed"""
+    quoted = {}
+
+    def placeholder(match):
+        name = f"__column{len(quoted)}"
+        quoted[name] = match.group(1)
+        return name
+
+    code = LOCAL_RE.sub("None", BACKTICK_RE.sub(placeholder, expr))
+    try:
+        tree = ast.parse(code.strip(), mode="eval")
+    except SyntaxError:
+        return None
+    functions = {node.func.id for node in ast.walk(tree)
+                 if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)}
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    return {quoted.get(name, name) for name in names - functions - {"index"}}
+
+
+class Query:
+    """A --query expression, analysed once to find the columns it needs.
+    Rows are filtered in batches, through DataFrames holding only these
+    columns with the dtype they have in the whole dataset."""
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.columns = query_columns(expr)
+
+    def ready(self, types):
+        """Tell whether a value of every column of the query was seen by
+        `types`, so that their dtype is known"""
+        return self.columns is None or all(types.columns.get(column, (0,))[0] for column in self.columns)
+
+    def filter(self, data, rows, types):
+        """Return the columns of the rows matching the query, `types` having
+        seen every row parsed so far"""
+        if self.columns is None:
+            columns = list(dict.fromkeys([*data, *types.columns]))
+        else:
+            # columns never seen are left out, for the query to fail as it
+            # does on the whole dataset
+            columns = [column for column in self.columns if column in types.columns]
+        # missing values as after pd.concat(): NaN in numeric columns, None
+        # in the others
+        frame = types.cast(pd.DataFrame({column: data.get(column, [None] * rows) for column in columns},
+                                        columns=columns, index=range(rows)))
+        keep = frame.query(self.expr).index
+        if len(keep) == rows:
+            return data, rows
+        return {key: [values[i] for i in keep] for key, values in data.items()}, len(keep)
+
+
+def projections(query=None, columns=None, dropc=None, sortby=None):
+    """Return the (include, exclude) column selections to use when parsing
+    rows, then once rows are filtered by `query`"""
+    sortby = set(sortby or ())
+    include = set(columns) | sortby if columns else None
+    exclude = set(dropc or ()) - sortby
+    if query is None:
+        return (include, exclude), (include, exclude)
+    if query.columns is None:
+        return (None, ()), (include, exclude)
+    parse_include = include | query.columns if include is not None else None
+    return (parse_include, exclude - query.columns), (include, exclude)
+
+
+def iter_rows(file_list, types, jobs=1, cache=None, query=None, columns=None, dropc=None, sortby=None,
+              json_backend="auto"):
+    """Yield (data, rows) batches of the parsed rows, keeping only those
+    matching `query` and the columns needed for the result. `types` is
+    updated with every parsed row, before filtering."""
+    (include, exclude), (out_include, out_exclude) = projections(query, columns, dropc, sortby)
+    batch = Columns()
+    for path, data, rows in iter_results(file_list, jobs, cache, include, exclude, json_backend):
+        # cached results hold every column
+        data = project(data, include, exclude)
+        types.update(data, rows)
+        if query is None:
+            yield data, rows
+            continue
+        batch.extend(data, rows)
+        # until the query columns have values, their dtype is unknown
+        if batch.rows >= BATCH_SIZE and query.ready(types):
+            data, rows = query.filter(batch.data, batch.rows, types)
+            yield project(data, out_include, out_exclude), rows
+            batch = Columns()
+    if batch.rows:
+        data, rows = query.filter(batch.data, batch.rows, types)
+        yield project(data, out_include, out_exclude), rows
+
+
+def load_reduced(file_list, types, jobs=1, cache=None, query=None, columns=None, dropc=None, sortby=None,
+                 json_backend="auto"):
+    """Parse all files into a DataFrame holding the rows matching `query`
+    and the columns needed for the result, or return None if no rows were
+    found. `types` is updated with every parsed row."""
+    result = Columns()
+    for data, rows in iter_rows(file_list, types, jobs, cache, query, columns, dropc, sortby, json_backend):
+        result.extend(data, rows)
+    if types.rows == 0:
+        return None
+    df = result.to_frame()
+    return types.cast(df)
+
+
+class ColumnTypes:
+    """Track the Python types found in each column of the concatenated rows,
+    to tell what pandas would make of them: numeric columns holding floats
+    or missing values become float64, whose integers are written as "1.0"
+    in CSV"""
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def update(self, data, rows):
+        for key, values in data.items():
+            present = [value for value in values if value is not None]
+            column = self.columns.setdefault(key, [0, set()])
+            column[0] += len(present)
+            column[1].update(map(type, present))
+        self.rows += rows
+
+    def float_columns(self):
+        return {key for key, (count, kinds) in self.columns.items()
+                if kinds and kinds <= {int, float} and (float in kinds or count < self.rows)}
+
+    def cast(self, df):
+        """Give float columns of a DataFrame holding part of the rows the
+        dtype they have in the whole dataset"""
+        for column in self.float_columns():
+            if column in df and df[column].dtype != float:
+                df[column] = df[column].astype(float)
+        return df
+
+    def arrow_schema(self, columns):
+        """Return the pyarrow schema of `columns`: numbers, booleans and
+        strings keep their type, columns holding anything else are strings"""
+        import pyarrow as pa
+        float_columns = self.float_columns()
+        fields = []
+        for column in columns:
+            count, kinds = self.columns.get(column, (0, set()))
+            if column in float_columns:
+                arrow_type = pa.float64()
+            elif kinds and kinds <= {int}:
+                arrow_type = pa.int64()
+            elif kinds == {bool}:
+                arrow_type = pa.bool_()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(str(column), arrow_type))
+        return pa.schema(fields)
+
+
+def row_key(row):
+    """Return a hashable key equal for the rows pandas considers duplicates"""
+    normalized = {str(key): int(value) if type(value) is float and value.is_integer() else value
+                  for key, value in row.items()}
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def sort_key(row, sortby, seq):
+    """Order rows like DataFrame.sort_values(): missing values last, ties
+    in the order rows were read"""
+    key = []
+    for column in sortby:
+        value = row.get(column)
+        key.append((1,) if value is None or value != value else (0, value))
+    key.append(seq)
+    return tuple(key)
+
+
+def dump_records(records, path):
+    with open(path, "wb") as file:
+        for record in records:
+            pickle.dump(record, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_records(path):
+    with open(path, "rb") as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+
+def partition_of(key, partitions, level=0):
+    """Return the partition of a row key, hashing it with another seed at
+    each level of re-partitioning"""
+    if level == 0:
+        return zlib.crc32(key.encode()) % partitions
+    digest = hashlib.blake2b(key.encode(), digest_size=8, salt=b"%d" % level).digest()
+    return int.from_bytes(digest, "little") % partitions
+
+
+def spill_rows(batches, partitions, directory):
+    """Write the rows of iter_rows() batches to `partitions` temporary files
+    by hash of their content, so that duplicates end up in the same file.
+    Return the partition files and the column order."""
+    paths = [os.path.join(directory, f"part{i}.pickle") for i in range(partitions)]
+    files = [open(path, "wb") for path in paths]
+    columns = {}
+    seq = 0
+    try:
+        for data, rows in batches:
+            columns.update(dict.fromkeys(data))
+            items = data.items()
+            for i in range(rows):
+                row = {key: values[i] for key, values in items if values[i] is not None}
+                key = row_key(row)
+                pickle.dump((seq, key, row), files[partition_of(key, partitions)],
+                            protocol=pickle.HIGHEST_PROTOCOL)
+                seq += 1
+    finally:
+        for file in files:
+            file.close()
+    return paths, list(columns)
+
+
+def split_partition(path, partitions, level):
+    """Spread the records of a partition file over `partitions` new ones,
+    in the same order. Return their paths."""
+    paths = [f"{path}.{i}" for i in range(partitions)]
+    files = [open(split_path, "wb") for split_path in paths]
+    try:
+        for record in load_records(path):
+            pickle.dump(record, files[partition_of(record[1], partitions, level)],
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for file in files:
+            file.close()
+    os.unlink(path)
+    return paths
+
+
+def sorted_runs(paths, sortby=None, memory_limit=None):
+    """Deduplicate one partition at a time, writing its rows sorted by
+    `sortby` (and reading order) to a run file. Yield the runs.
+
+    Partitions too big to be loaded within `memory_limit` bytes are split
+    again first, by a hash with another seed, as many times as needed."""
+    pending = [(path, 1) for path in reversed(paths)]
+    while pending:
+        path, level = pending.pop()
+        size = os.path.getsize(path)
+        if memory_limit and size * PARTITION_EXPANSION > memory_limit:
+            partitions = min(MAX_PARTITIONS, math.ceil(size * PARTITION_EXPANSION / memory_limit))
+            split_paths = split_partition(path, partitions, level)
+            sizes = [os.path.getsize(split_path) for split_path in split_paths]
+            if max(sizes) < size:
+                pending.extend((split_path, level + 1) for split_path in reversed(split_paths))
+                continue
+            # copies of a single row, which take no room once deduplicated
+            path = split_paths[sizes.index(size)]
+            for split_path in split_paths:
+                if split_path != path:
+                    os.unlink(split_path)
+        seen = set()
+        rows = []
+        # partitions are written in reading order, keep the first duplicate
+        for seq, key, row in load_records(path):
+            if key not in seen:
+                seen.add(key)
+                rows.append((seq, row))
+        os.unlink(path)
+        del seen
+        if not rows:
+            continue
+        records = [(sort_key(row, sortby or (), seq), row) for seq, row in rows]
+        del rows
+        records.sort(key=itemgetter(0))
+        run = path + ".run"
+        dump_records(records, run)
+        yield run
+
+
+def merge_runs(runs):
+    """Yield the rows of sorted runs in global order, first merging them by
+    groups of MAX_PARTITIONS into longer runs while there are more"""
+    while len(runs) > MAX_PARTITIONS:
+        merged_runs = []
+        for start in range(0, len(runs), MAX_PARTITIONS):
+            group = runs[start:start + MAX_PARTITIONS]
+            run = group[0] + ".merged"
+            dump_records(heapq.merge(*(load_records(path) for path in group), key=itemgetter(0)), run)
+            for path in group:
+                os.unlink(path)
+            merged_runs.append(run)
+        runs = merged_runs
+    merged = heapq.merge(*(load_records(run) for run in runs), key=itemgetter(0))
+    for key, row in merged:
+        yield row
+
+
+def row_frames(rows, columns, types):
+    """Yield DataFrames of WRITE_BATCH rows, at least one"""
+    rows = iter(rows)
+    first = True
+    while (batch := list(islice(rows, WRITE_BATCH))) or first:
+        yield types.cast(pd.DataFrame(batch, columns=columns))
+        first = False
+
+
+def frame_slices(df):
+    """Yield slices of WRITE_BATCH rows of a DataFrame, at least one"""
+    for start in range(0, max(len(df), 1), WRITE_BATCH):
+        yield df.iloc[start:start + WRITE_BATCH]
+
+
+class CSVWriter:
+    binary = False
+
+    def __init__(self, file, columns, types):
+        self.file = file
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class JSONLinesWriter:
+    binary = False
+
+    def __init__(self, file, columns, types):
+        self.file = file
+
+    def write(self, df):
+        text = df.to_json(orient="records", lines=True, force_ascii=False)
+        if text and not text.endswith("\n"):
+            text += "\n"
+        self.file.write(text)
+
+    def close(self):
+        pass
+
+
+class ArrowWriter:
+    """Write Parquet (a row group per DataFrame) or Feather (a record batch
+    per DataFrame) files through pyarrow"""
+    binary = True
+
+    def __init__(self, file, columns, types, format="parquet"):
+        import pyarrow as pa
+        self.pa = pa
+        self.schema = types.arrow_schema(columns)
+        if format == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(file, self.schema)
         else:
-            df_list.append(pd.DataFrame.from_dict(obj))
-            #result_df = pd.concat([result_df, pd.DataFrame.from_dict(obj)], ignore_index=True)
-            row_count += df_list[-1].shape[0]
-            logging.info("Current row count: %d", row_count)
-
-if row_count == 0:
-    logging.warning("No data was parsed. Verify if files in directory contains lists of objects")
-else:
-    result_df = pd.concat(df_list, ignore_index=True)
-    logging.info("Content parsed. Removing duplicates...")
-    result_df.drop_duplicates(inplace=True)
+            self.writer = pa.ipc.new_file(file, self.schema)
+
+    def write(self, df):
+        df = df.set_axis([str(column) for column in df.columns], axis=1)
+        for field in self.schema:
+            if field.type == self.pa.string():
+                # as in CSV output, values that are not strings are written as such
+                df[field.name] = [value if value is None or isinstance(value, str)
+                                  or value != value else str(value)
+                                  for value in df[field.name]]
+        table = self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+        "csv": CSVWriter,
+        "jsonl": JSONLinesWriter,
+        "parquet": partial(ArrowWriter, format="parquet"),
+        "feather": partial(ArrowWriter, format="feather"),
+        }
+
+
+def output_format(path, format=None):
+    """Return the format given, the one matching the extension of the output
+    file or CSV"""
+    if format:
+        return format
+    if path and path != "-":
+        return FORMAT_SUFFIXES.get(Path(path).suffix.lower(), "csv")
+    return "csv"
+
+
+def write_output(frames, columns, types, format="csv", path=None):
+    """Write DataFrames to `path` (standard output if None or "-") as they
+    come, in the given format"""
+    writer_class = WRITERS[format]
+    binary = format in ("parquet", "feather")
+    if path is None or path == "-":
+        output = nullcontext(sys.stdout.buffer if binary else sys.stdout)
+    else:
+        output = open(path, "wb") if binary else open(path, "w", newline="")
+    with output as file:
+        writer = writer_class(file, columns, types)
+        try:
+            for df in frames:
+                writer.write(df)
+        finally:
+            writer.close()
+        if format == "csv" and (path is None or path == "-"):
+            # the CSV used to be printed as a whole, ending with an empty line
+            file.write("\n")
+
+
+def process_out_of_core(file_list, args, cache=None, query=None):
+    """Parse, filter, deduplicate, sort and write the rows of all files with
+    memory bound by args.memorylimit, going through temporary files"""
+    memory_limit = args.memorylimit << 20
+    # the number of partitions depends on the size of all files, those that
+    # still don't fit in memory are split again
+    file_list = list(file_list)
+    input_size = sum(os.path.getsize(path) for path in file_list)
+    partitions = min(MAX_PARTITIONS, max(1, math.ceil(input_size * EXPANSION / memory_limit)))
+    with tempfile.TemporaryDirectory(prefix="parseJSONFromDir-", dir=args.tmpdir) as tmpdir:
+        types = ColumnTypes()
+        batches = iter_rows(file_list, types, args.jobs, cache, query, args.columns, args.dropc, args.sortby,
+                            args.jsonbackend)
+        paths, columns = spill_rows(batches, partitions, tmpdir)
+        if types.rows == 0:
+            logging.warning("No data was parsed. Verify if files in directory contains lists of objects")
+            return
+        logging.info("Content parsed. Removing duplicates in %d partitions...", partitions)
+        runs = list(sorted_runs(paths, args.sortby, memory_limit))
+        if args.dropc:
+            columns = [column for column in columns if column not in args.dropc]
+        if args.columns:
+            missing = [column for column in args.columns if column not in columns]
+            if missing:
+                logging.error("Unknown columns: %s", ", ".join(map(str, missing)))
+                exit(1)
+            columns = args.columns
+        logging.info("Merging %d sorted runs...", len(runs))
+        frames = row_frames(merge_runs(runs), columns, types)
+        write_output(frames, columns, types, output_format(args.output, args.format), args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse JSON lists from files inside a directory")
+    parser.add_argument(
+            "dir",
+            help="root directories",
+            nargs='+',
+            )
+    parser.add_argument(
+            "-n",
+            "--dry-run",
+            dest="dryrun",
+            help="Only list the files that should be read",
+            action="store_true",
+            )
+    parser.add_argument(
+            "-r",
+            "--recursive",
+            help="Recursively search for files starting from root directory",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--max-depth",
+            dest="maxdepth",
+            type=int,
+            help="Levels of subdirectories to search with --recursive (default: no limit)",
+            metavar="N",
+            )
+    parser.add_argument(
+            "--include",
+            action="append",
+            help="Only read files whose name or path match this glob (can be repeated)",
+            metavar="GLOB",
+            )
+    parser.add_argument(
+            "--exclude",
+            action="append",
+            help="Skip files and directories whose name or path match this glob (can be repeated)",
+            metavar="GLOB",
+            )
+    parser.add_argument(
+            "--symlinks",
+            choices=SYMLINK_POLICIES,
+            default="follow",
+            help="Follow all symbolic links, only those to files, or none (default: %(default)s)",
+            )
+    parser.add_argument(
+            "--walk-threads",
+            dest="walkthreads",
+            type=int,
+            default=1,
+            help="Threads listing subdirectories ahead (default: %(default)s)",
+            metavar="N",
+            )
+    parser.add_argument(
+            "-s",
+            "--silent",
+            help="Ommit logging messages",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--columns",
+            nargs='+',
+            help="Columns to write to output",
+            dest="columns",
+            metavar="COLUMN"
+            )
+    parser.add_argument(
+            "--drop-columns",
+            nargs='+',
+            help="Drop columns (properties) from result",
+            dest="dropc",
+            metavar="COLUMN",
+            )
+    parser.add_argument(
+            "--sort-by",
+            nargs='+',
+            help="Sort result by columns",
+            dest="sortby",
+            metavar="COLUMN",
+            )
+    parser.add_argument(
+            "--query",
+            type=str,
+            help="Apply query to filter final dataset",
+            )
+    parser.add_argument(
+            "-o",
+            "--output",
+            help="Write the result to this file instead of standard output",
+            metavar="FILE",
+            )
+    parser.add_argument(
+            "-f",
+            "--format",
+            choices=FORMATS,
+            help="Output format (default: guessed from the extension of --output, or csv)",
+            )
+    parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of processes parsing files (default: %(default)s)",
+            )
+    parser.add_argument(
+            "--json-backend",
+            dest="jsonbackend",
+            choices=BACKENDS,
+            default="auto",
+            help="Library decoding JSON, auto picking the fastest installed (default: %(default)s)",
+            )
+    parser.add_argument(
+            "--no-cache",
+            dest="nocache",
+            help="Parse every file without reading or updating the cache",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--rebuild-cache",
+            dest="rebuild",
+            help="Discard the cache and parse every file again",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--cache-dir",
+            dest="cachedir",
+            help="Cache directory (default: $XDG_CACHE_HOME/utils/parseJSONFromDir)",
+            metavar="DIR",
+            )
+    parser.add_argument(
+            "--cache-size",
+            dest="cachesize",
+            type=int,
+            default=CACHE_SIZE,
+            help="Maximum size of the cache in MiB (default: %(default)s)",
+            metavar="MIB",
+            )
+    parser.add_argument(
+            "--hash",
+            help="Also compare file contents to decide whether cached results are valid",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--memory-limit",
+            dest="memorylimit",
+            type=int,
+            help="Deduplicate and sort through temporary files, using about this much memory in MiB",
+            metavar="MIB",
+            )
+    parser.add_argument(
+            "--tmpdir",
+            help="Directory for the temporary files of --memory-limit (default: system temp dir)",
+            metavar="DIR",
+            )
+
+    args = parser.parse_args()
+
+    if output_format(args.output, args.format) in ("parquet", "feather"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("Parquet and Feather output require pyarrow")
+    try:
+        get_backend(args.jsonbackend)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if (args.silent):
+        logging.disable()
+
+    logging.info("Searching files starting from %s", args.dir)
+
+    file_list = walk_files(
+            args.dir,
+            max_depth=args.maxdepth if args.recursive else 0,
+            include=args.include,
+            exclude=args.exclude,
+            symlinks=args.symlinks,
+            threads=args.walkthreads,
+            onerror=lambda e: logging.error("Unable to list directory: %s", e),
+            )
+
+    if args.dryrun:
+        for file in file_list:
+            logging.info("Found file %s", file)
+        logging.info("Running in dry-run mode, so finishing here")
+        exit(0)
+
+    cache = None
+    if not args.nocache:
+        cache = ParseCache(args.cachedir, args.cachesize << 20, args.hash, args.rebuild, args.jsonbackend)
+    query = None
     if args.query:
-        logging.info("Applying query to dataset...")
-        result_df.query(args.query, inplace=True)
-    if args.sortby:
-        logging.info("Sorting data...")
-        result_df.sort_values(args.sortby, inplace=True)
-    if args.dropc:
-        logging.info("Dropping columns from result...")
-        result_df.drop(columns=args.dropc, inplace=True)
-    print(result_df.to_csv(index=False, columns=args.columns))
+        logging.info("Applying query to rows as they are parsed...")
+        query = Query(args.query)
+
+    if args.memorylimit:
+        process_out_of_core(file_list, args, cache, query)
+        exit(0)
+
+    types = ColumnTypes()
+    result_df = load_reduced(file_list, types, args.jobs, cache, query, args.columns, args.dropc, args.sortby,
+                             args.jsonbackend)
+
+    if result_df is None:
+        logging.warning("No data was parsed. Verify if files in directory contains lists of objects")
+    else:
+        logging.info("Content parsed. Removing duplicates...")
+        result_df.drop_duplicates(inplace=True)
+        if args.sortby:
+            logging.info("Sorting data...")
+            result_df.sort_values(args.sortby, inplace=True)
+        if args.dropc:
+            logging.info("Dropping columns from result...")
+            # columns only needed for sorting, the others were never loaded
+            result_df.drop(columns=[c for c in args.dropc if c in result_df], inplace=True)
+        if args.columns:
+            result_df = result_df[args.columns]
+        columns = list(result_df.columns)
+        write_output(frame_slices(result_df), columns, types, output_format(args.output, args.format), args.output)
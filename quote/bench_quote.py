@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Compare the bulk codec used by quote.py/unquote.py with the original
+per-line implementation (`urllib.parse.quote`/`unquote` plus `print`).
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+import urllib.parse
+
+import codec
+
+CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJ0123456789@#%&/?=+ .-_~!$'()*<>\"éü€"
+
+
+def per_line(path, function):
+    with open(path) as file, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for line in file:
+            print(function(line.rstrip()))
+
+
+def bulk(path, decode, jobs):
+    with open(os.devnull, "wb") as devnull:
+        codec.run([path], devnull, dict(decode=decode), jobs)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quote/unquote implementations")
+    parser.add_argument("--lines", type=int, default=2000000, help="Wordlist size (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, default=4, help="Processes for the parallel run (default: %(default)s)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = ["".join(rng.choice(CHARS) for _ in range(rng.randint(4, 24))) for _ in range(args.lines)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        plain = os.path.join(tmpdir, "plain.txt")
+        quoted = os.path.join(tmpdir, "quoted.txt")
+        with open(plain, "w") as file:
+            file.write("\n".join(words) + "\n")
+        with open(quoted, "w") as file:
+            file.write("\n".join(map(urllib.parse.quote, words)) + "\n")
+
+        print(f"{'operation':<10} {'per-line':>10} {'bulk':>10} {f'bulk -j{args.jobs}':>10}")
+        for name, path, function, decode in (("quote", plain, urllib.parse.quote, False),
+                                             ("unquote", quoted, urllib.parse.unquote, True)):
+            print(f"{name:<10} {timed(per_line, path, function):>9.2f}s "
+                  f"{timed(bulk, path, decode, 1):>9.2f}s {timed(bulk, path, decode, args.jobs):>9.2f}s")
@@ -0,0 +1,191 @@
+# MIT License
+#
+# Copyright (c) 2021 y0k4i
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Bulk URL encoding/decoding of newline-separated byte buffers, shared by
+quote.py and unquote.py.
+
+Each line gets the same result as `urllib.parse.quote(line.rstrip())` (or
+`unquote`), but whole buffers are processed at once with C-level bytes
+operations instead of Python calls per line or per character:
+
+  - quoting looks up the unsafe bytes present in the buffer and replaces each
+    of them with its `%XX` escape from a precomputed 256-entry table;
+  - unquoting turns `%XX` into `\\xXX` and lets the `unicode_escape` codec
+    decode every escape in one pass.
+"""
+
+import argparse
+import re
+import sys
+from multiprocessing import Pool
+
+# bytes never escaped by urllib.parse.quote
+ALWAYS_SAFE = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~"
+# trailing whitespace removed from every line (ASCII part of str.rstrip())
+TRAILING_SPACE = re.compile(rb"[ \t\r\x0b\x0c\x1c-\x1f]+$", re.MULTILINE)
+# same, with the UTF-8 encoding of the other characters str.rstrip() removes
+# (U+0085, U+00A0, U+1680, U+2000-U+200A, U+2028, U+2029, U+202F, U+205F and
+# U+3000), for buffers that are not pure ASCII
+TRAILING_UNICODE_SPACE = re.compile(
+    rb"(?:[ \t\r\x0b\x0c\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]"
+    rb"|\xe2\x81\x9f|\xe3\x80\x80)+$", re.MULTILINE)
+# '%' not starting a valid escape, kept as is by unquote
+LONE_PERCENT = re.compile(rb"%(?![0-9A-Fa-f]{2})")
+# escape of every byte value
+ESCAPES = [b"%%%02X" % i for i in range(256)]
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def escape_table(safe=b"/"):
+    """Return the 256-entry table telling which bytes must be escaped"""
+    table = [True] * 256
+    for char in ALWAYS_SAFE + safe + b"\n":
+        table[char] = False
+    return table
+
+
+class Codec:
+    """Quote or unquote newline-separated buffers.
+
+    `safe` are the bytes not escaped besides letters, digits and `_.-~`,
+    `plus` works like `quote_plus`/`unquote_plus`, `double` applies the
+    operation twice and `binary` passes invalid UTF-8 through instead of
+    raising UnicodeDecodeError (quote) or replacing it (unquote)."""
+
+    def __init__(self, decode=False, safe=None, plus=False, double=False, binary=False):
+        if safe is None:
+            safe = "" if plus else "/"
+        self.decode = decode
+        self.plus = plus
+        self.double = double
+        self.binary = binary
+        safe = safe.encode()
+        if plus:
+            # spaces are turned into '+' after escaping the rest
+            safe += b" "
+        table = escape_table(safe)
+        self.safe = bytes(i for i in range(256) if not table[i])
+
+    def quote(self, data):
+        # unsafe bytes present in the buffer
+        unsafe = set(data.translate(None, self.safe))
+        if ord("%") in unsafe:
+            # first, so that the other escapes are left alone
+            data = data.replace(b"%", b"%25")
+            unsafe.discard(ord("%"))
+        for char in unsafe:
+            data = data.replace(bytes((char,)), ESCAPES[char])
+        if self.plus:
+            data = data.replace(b" ", b"+")
+        return data
+
+    def unquote(self, data):
+        if self.plus:
+            data = data.replace(b"+", b" ")
+        data = LONE_PERCENT.sub(b"%25", data)
+        data = (data.replace(b"\\", b"\\\\").replace(b"%", b"\\x")
+                .decode("unicode_escape").encode("latin-1"))
+        if not self.binary:
+            data = data.decode("utf-8", "replace").encode("utf-8")
+        return data
+
+    def __call__(self, data):
+        """Process a buffer made of complete lines"""
+        data = (TRAILING_SPACE if data.isascii() else TRAILING_UNICODE_SPACE).sub(b"", data)
+        if not self.decode and not self.binary:
+            # fail on invalid input like urllib does on undecodable text
+            data.decode("utf-8")
+        operation = self.unquote if self.decode else self.quote
+        data = operation(data)
+        if self.double:
+            data = operation(data)
+        return data
+
+
+def read_chunks(paths, chunk_size=CHUNK_SIZE):
+    """Yield buffers of complete lines from the given files (or stdin if
+    there are none, or for '-'), each ending with a newline"""
+    for path in paths or ["-"]:
+        file = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            rest = b""
+            while data := file.read(chunk_size):
+                data = rest + data
+                end = data.rfind(b"\n") + 1
+                rest = data[end:]
+                if end:
+                    yield data[:end]
+            if rest:
+                yield rest + b"\n"
+        finally:
+            if file is not sys.stdin.buffer:
+                file.close()
+
+
+def init_worker(options):
+    global worker_codec
+    worker_codec = Codec(**options)
+
+
+def process_chunk(data):
+    """Worker task in --jobs mode"""
+    return worker_codec(data)
+
+
+def run(paths, out, options, jobs=1, chunk_size=CHUNK_SIZE):
+    """Process the given files chunk by chunk, in a pool of `jobs` processes
+    if more than one is requested, and write the result to `out` in order"""
+    chunks = read_chunks(paths, chunk_size)
+    if jobs <= 1:
+        results = map(Codec(**options), chunks)
+        for result in results:
+            out.write(result)
+        return
+    with Pool(jobs, initializer=init_worker, initargs=(options,)) as pool:
+        for result in pool.imap(process_chunk, chunks):
+            out.write(result)
+
+
+def main(decode=False):
+    operation = "decode" if decode else "encode"
+    parser = argparse.ArgumentParser(description=f"URL {operation} lines from files or from stdin")
+    parser.add_argument("files", nargs="*", metavar="FILE", help="Input files (default: stdin)")
+    if not decode:
+        parser.add_argument("--safe", help="Characters that should not be escaped "
+                                           "(default: '/', or none with --plus)")
+    parser.add_argument("-p", "--plus", action="store_true",
+                        help="Use '+' for spaces, like quote_plus/unquote_plus")
+    parser.add_argument("-d", "--double", action="store_true", help=f"URL {operation} twice")
+    parser.add_argument("-b", "--binary", action="store_true",
+                        help="Process raw bytes, without requiring valid UTF-8")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="Process chunks in a pool of N processes, keeping the line order "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    options = dict(decode=decode, safe=getattr(args, "safe", None), plus=args.plus,
+                   double=args.double, binary=args.binary)
+    try:
+        run(args.files, sys.stdout.buffer, options, args.jobs)
+    except UnicodeDecodeError as e:
+        print(f"Error: input is not valid UTF-8 ({e}), use --binary", file=sys.stderr)
+        sys.exit(1)
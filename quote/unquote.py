@@ -20,8 +20,10 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import urllib.parse
-import fileinput
+"""
+URL decode lines from files or from stdin.
+"""
+from codec import main
 
-for line in fileinput.input():
-    print(urllib.parse.unquote(line.rstrip()))
+if __name__ == "__main__":
+    main(decode=True)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Compare the block-based expansion engine of uncidr.py with the original
+per-object path (`IPv4Network.hosts()` plus one `print()` per address).
+"""
+
+import argparse
+import contextlib
+import ipaddress
+import os
+import time
+
+import uncidr
+
+
+def per_object(cidr):
+    network = ipaddress.IPv4Network(cidr, strict=False)
+    for ip in network.hosts():
+        print(ip)
+
+
+def timed(func, cidr):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        func(cidr)
+        return time.perf_counter() - start
+
+
+def block_engine(cidr):
+    with open(os.devnull, "wb") as devnull:
+        uncidr.get_all_ips_in_cidr(cidr, devnull)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark uncidr expansion engines")
+    parser.add_argument(
+            "prefixes",
+            nargs="*",
+            type=int,
+            default=[16, 12, 8],
+            help="Prefix lengths to benchmark (default: %(default)s)",
+            )
+    parser.add_argument(
+            "--skip-reference",
+            action="store_true",
+            help="Do not run the per-object reference path (slow on /8)",
+            )
+    args = parser.parse_args()
+
+    print(f"{'cidr':<14} {'hosts':>10} {'per-object':>12} {'blocks':>10} {'speedup':>8}")
+    for prefix in args.prefixes:
+        cidr = f"10.0.0.0/{prefix}"
+        hosts = ipaddress.IPv4Network(cidr).num_addresses - 2
+        fast = timed(block_engine, cidr)
+        if args.skip_reference:
+            print(f"{cidr:<14} {hosts:>10} {'-':>12} {fast:>9.3f}s {'-':>8}")
+            continue
+        slow = timed(per_object, cidr)
+        print(f"{cidr:<14} {hosts:>10} {slow:>11.3f}s {fast:>9.3f}s {slow / fast:>7.1f}x")
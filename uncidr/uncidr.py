@@ -22,30 +22,403 @@
 # SOFTWARE.
 """
 This script will print all the IP addresses in a given CIDR range.
+
+Addresses are computed from the integer bounds of each network and formatted
+one /24 block at a time with a precomputed octet table, so no `IPv4Address`
+object is created per host. The output is written to `sys.stdout.buffer` in
+large chunks.
+
+Besides CIDRs, targets may be single addresses, `first-last` ranges and IPv6
+prefixes. In merge mode every target is read first and merged into a sorted
+list of disjoint intervals, so overlapping inputs print each address once.
 """
 
 
+import argparse
+import bisect
 import ipaddress
+import multiprocessing
+import random
 import sys
 
+# decimal representation of every octet value
+OCTETS = [str(i).encode() for i in range(256)]
+# flush output once this many bytes have been accumulated
+BUFFER_SIZE = 1 << 20
+# number of IPv6 addresses formatted per output chunk
+IPV6_CHUNK = 4096
+# refuse (or sample) IPv6 expansions larger than this
+IPV6_LIMIT = 1 << 16
+# number of addresses formatted by each worker task in --jobs mode
+RUN_SIZE = 1 << 20
+
+
+def ipv4_hosts_range(network):
+    """Return the first and last usable hosts of `network` as integers,
+    following the same rules as `IPv4Network.hosts()`"""
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if network.prefixlen < 31:
+        first += 1
+        last -= 1
+    return first, last
+
+
+def ipv6_hosts_range(network):
+    """Return the first and last usable hosts of `network` as integers,
+    following the same rules as `IPv6Network.hosts()`"""
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if network.prefixlen < 127:
+        # skip the Subnet-Router anycast address
+        first += 1
+    return first, last
+
+
+def parse_target(target, hosts=True):
+    """Parse a CIDR, a single address or a `first-last` range into a
+    `(version, first, last)` tuple of integers.
+
+    If `hosts` is true, networks only cover their usable hosts, as in
+    `hosts()`; otherwise the whole network is covered.
+    Raise ValueError if the target is invalid."""
+    if "-" in target:
+        start, end = target.split("-", 1)
+        first = ipaddress.ip_address(start.strip())
+        last = ipaddress.ip_address(end.strip())
+        if first.version != last.version:
+            raise ValueError(f"Mixed address families in range '{target}'")
+        if first > last:
+            raise ValueError(f"Range start is greater than its end in '{target}'")
+        return first.version, int(first), int(last)
+
+    network = ipaddress.ip_network(target, strict=False)
+    if not hosts:
+        return (network.version, int(network.network_address),
+                int(network.broadcast_address))
+    if network.version == 4:
+        return (4, *ipv4_hosts_range(network))
+    return (6, *ipv6_hosts_range(network))
+
+
+def read_targets(lines, hosts=True):
+    """Parse targets from `lines`, skipping blanks and comments and
+    reporting invalid entries to stderr"""
+    for line in lines:
+        target = line.split("#", 1)[0].strip()
+        if not target:
+            continue
+        try:
+            yield parse_target(target, hosts)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+
+
+def merge_intervals(intervals):
+    """Merge `(first, last)` intervals into a sorted list of disjoint,
+    non-adjacent intervals"""
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1][1] = last
+        else:
+            merged.append([first, last])
+    return [tuple(interval) for interval in merged]
+
+
+def subtract_intervals(intervals, excluded):
+    """Remove the `excluded` intervals from `intervals` (both as returned
+    by `merge_intervals`)"""
+    result = []
+    starts = [first for first, _ in excluded]
+    for first, last in intervals:
+        # first exclusion that may overlap the interval
+        i = max(bisect.bisect_right(starts, first) - 1, 0)
+        while first <= last and i < len(excluded):
+            ex_first, ex_last = excluded[i]
+            if ex_first > last:
+                break
+            if ex_last >= first:
+                if ex_first > first:
+                    result.append((first, ex_first - 1))
+                first = ex_last + 1
+            i += 1
+        if first <= last:
+            result.append((first, last))
+    return result
+
+
+def count_addresses(intervals):
+    return sum(last - first + 1 for first, last in intervals)
+
+
+def sample_intervals(intervals, size, rng=random):
+    """Pick `size` distinct addresses uniformly from `intervals`, returned
+    as sorted single-address intervals"""
+    total = count_addresses(intervals)
+    size = min(size, total)
+    offsets = []
+    ends = []
+    for first, last in intervals:
+        offsets.append(first)
+        ends.append((ends[-1] if ends else 0) + last - first + 1)
+    picked = set()
+    while len(picked) < size:
+        picked.add(rng.randrange(total))
+    sample = []
+    for index in sorted(picked):
+        i = bisect.bisect_right(ends, index)
+        address = offsets[i] + index - (ends[i - 1] if i else 0)
+        sample.append((address, address))
+    return sample
+
+
+def format_ipv4_range(first, last, step=1):
+    """Yield newline-terminated dotted quads from `first` to `last`
+    (inclusive), every `step` addresses, as bytes, one chunk per /24 block"""
+    while first <= last:
+        block_last = min(first | 0xff, last)
+        prefix = b"%d.%d.%d." % (first >> 24, (first >> 16) & 0xff, (first >> 8) & 0xff)
+        octets = OCTETS[first & 0xff:(block_last & 0xff) + 1:step]
+        yield prefix + (b"\n" + prefix).join(octets) + b"\n"
+        first += step * len(octets)
+
+
+def format_ipv6_range(first, last, step=1):
+    """Yield newline-terminated IPv6 addresses from `first` to `last`
+    (inclusive), every `step` addresses, as bytes, `IPV6_CHUNK` addresses
+    per chunk"""
+    while first <= last:
+        chunk_last = min(first + step * (IPV6_CHUNK - 1), last)
+        yield "".join(f"{ipaddress.IPv6Address(i)}\n"
+                      for i in range(first, chunk_last + 1, step)).encode()
+        first = chunk_last + step
+
+
+def format_intervals(version, intervals):
+    format_range = format_ipv4_range if version == 4 else format_ipv6_range
+    for first, last in intervals:
+        yield from format_range(first, last)
+
 
-def get_all_ips_in_cidr(cidr):
+def format_runs(runs):
+    """Yield the formatted chunks of `(version, first, last, step)` runs"""
+    for version, first, last, step in runs:
+        format_range = format_ipv4_range if version == 4 else format_ipv6_range
+        yield from format_range(first, last, step)
+
+
+def format_run(run):
+    """Format a single run as one bytes object (worker task in --jobs mode)"""
+    return b"".join(format_runs([run]))
+
+
+def parse_shard(shard):
+    """Parse an `i/N` shard specification (1 <= i <= N) into a tuple"""
     try:
-        network = ipaddress.IPv4Network(cidr, strict=False)
-        for ip in network.hosts():
-            print(ip)
-    except ipaddress.AddressValueError as e:
-        print(f"Error: {e}")
-    except ipaddress.NetmaskValueError as e:
+        index, count = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{shard}' (expected i/N)")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{shard}' (expected 1 <= i <= N)")
+    return index, count
+
+
+def shard_runs(intervals_by_version, index=1, count=1, stride=False):
+    """Select the addresses owned by shard `index` of `count` from the merged
+    address space (IPv4 intervals first, then IPv6) and return them as
+    `(version, first, last, step)` runs.
+
+    Shards are contiguous blocks of the address space, or interleaved every
+    `count` addresses if `stride` is true."""
+    space = [(version, first, last)
+             for version in (4, 6)
+             for first, last in intervals_by_version.get(version, [])]
+    total = sum(last - first + 1 for _, first, last in space)
+    if stride:
+        start, stop, step = index - 1, total, count
+    else:
+        start, stop, step = total * (index - 1) // count, total * index // count, 1
+
+    runs = []
+    base = 0
+    for version, first, last in space:
+        size = last - first + 1
+        # first and last selected positions inside this interval
+        lower = max(start, base)
+        k_first = start + -(-(lower - start) // step) * step
+        k_end = min(stop, base + size) - 1
+        if k_first <= k_end:
+            k_last = k_first + (k_end - k_first) // step * step
+            runs.append((version, first + k_first - base, first + k_last - base, step))
+        base += size
+    return runs
+
+
+def split_runs(runs, size=RUN_SIZE):
+    """Split runs into pieces of at most `size` addresses"""
+    for version, first, last, step in runs:
+        while first <= last:
+            piece_last = min(first + step * (size - 1), last)
+            yield version, first, piece_last, step
+            first = piece_last + step
+
+
+def write_chunks(chunks, out=None):
+    """Write byte chunks to `out` (default: stdout) in batches of about
+    `BUFFER_SIZE` bytes"""
+    if out is None:
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= BUFFER_SIZE:
+            out.write(b"".join(buffer))
+            buffer = []
+            size = 0
+    if buffer:
+        out.write(b"".join(buffer))
+    out.flush()
+
+
+def limit_ipv6(intervals, limit=IPV6_LIMIT, sample=False, rng=random):
+    """Apply the IPv6 expansion cap to `intervals`: return them unchanged if
+    they are within `limit`, a random sample of `limit` addresses if `sample`
+    is true, or raise ValueError otherwise"""
+    total = count_addresses(intervals)
+    if total <= limit:
+        return intervals
+    if sample:
+        return sample_intervals(intervals, limit, rng)
+    raise ValueError(f"Refusing to expand {total} IPv6 addresses (limit is {limit})")
+
+
+def get_all_ips_in_cidr(cidr, out=None, v6_limit=IPV6_LIMIT, v6_sample=False):
+    try:
+        version, first, last = parse_target(cidr)
+        intervals = [(first, last)]
+        if version == 6:
+            intervals = limit_ipv6(intervals, v6_limit, v6_sample)
+    except ValueError as e:
         print(f"Error: {e}")
+    else:
+        write_chunks(format_intervals(version, intervals), out)
+
+
+def write_runs(runs, out=None, jobs=1, ordered=True):
+    """Write the addresses of `runs`, formatting them in a pool of `jobs`
+    processes if more than one is requested"""
+    if jobs <= 1:
+        write_chunks(format_runs(runs), out)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        write_chunks(imap(format_run, split_runs(runs)), out)
+
+
+def expand_merged(targets, excluded=(), out=None, v6_limit=IPV6_LIMIT, v6_sample=False,
+                  shard=(1, 1), stride=False, jobs=1, ordered=True):
+    """Merge `(version, first, last)` targets into disjoint intervals, remove
+    the `excluded` ones and write every remaining address of the given
+    `shard` once"""
+    by_version = {4: [], 6: []}
+    for version, first, last in targets:
+        by_version[version].append((first, last))
+    excluded_by_version = {4: [], 6: []}
+    for version, first, last in excluded:
+        excluded_by_version[version].append((first, last))
+
+    intervals_by_version = {}
+    for version in (4, 6):
+        intervals = subtract_intervals(merge_intervals(by_version[version]),
+                                       merge_intervals(excluded_by_version[version]))
+        if version == 6:
+            try:
+                intervals = limit_ipv6(intervals, v6_limit, v6_sample)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                continue
+        intervals_by_version[version] = intervals
+
+    runs = shard_runs(intervals_by_version, *shard, stride=stride)
+    write_runs(runs, out, jobs, ordered)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) >= 2:
-        cidr_input = sys.argv[1]
-        get_all_ips_in_cidr(cidr_input)
+    parser = argparse.ArgumentParser(description="Print all the IP addresses in the given targets")
+    parser.add_argument(
+            "targets",
+            nargs="*",
+            metavar="TARGET",
+            help="CIDR, address or first-last range (default: read from stdin)",
+            )
+    parser.add_argument(
+            "-m",
+            "--merge",
+            help="Read all targets first and print each address only once, in order",
+            action="store_true",
+            )
+    parser.add_argument(
+            "-e",
+            "--exclude",
+            help="File with targets to exclude from the output (implies --merge)",
+            metavar="FILE",
+            action="append",
+            default=[],
+            )
+    parser.add_argument(
+            "--v6-limit",
+            help="Maximum number of IPv6 addresses to expand (default: %(default)s)",
+            metavar="N",
+            type=int,
+            default=IPV6_LIMIT,
+            )
+    parser.add_argument(
+            "--v6-sample",
+            help="Print a random sample of --v6-limit addresses instead of refusing larger IPv6 expansions",
+            action="store_true",
+            )
+    parser.add_argument(
+            "--shard",
+            help="Only print the i-th of N shards of the merged address space (implies --merge)",
+            metavar="i/N",
+            type=parse_shard,
+            )
+    parser.add_argument(
+            "--stride",
+            help="Interleave shards every N addresses instead of splitting contiguous blocks",
+            action="store_true",
+            )
+    parser.add_argument(
+            "-j",
+            "--jobs",
+            help="Format addresses in a pool of N processes (implies --merge)",
+            metavar="N",
+            type=int,
+            default=1,
+            )
+    parser.add_argument(
+            "--unordered",
+            help="With --jobs, write blocks as soon as they are ready instead of in order",
+            action="store_true",
+            )
+    args = parser.parse_args()
+
+    # Read targets from stdin line by line if none were given
+    lines = args.targets or sys.stdin
+    if args.merge or args.exclude or args.shard or args.jobs > 1:
+        excluded = []
+        for path in args.exclude:
+            with open(path) as file:
+                excluded.extend(read_targets(file, hosts=False))
+        expand_merged(read_targets(lines), excluded,
+                      v6_limit=args.v6_limit, v6_sample=args.v6_sample,
+                      shard=args.shard or (1, 1), stride=args.stride,
+                      jobs=args.jobs, ordered=not args.unordered)
     else:
-        # Read CIDR notations from stdin line by line
-        for line in sys.stdin:
-            cidr_input = line.strip()
-            get_all_ips_in_cidr(cidr_input)
+        for line in lines:
+            get_all_ips_in_cidr(line.strip(), v6_limit=args.v6_limit, v6_sample=args.v6_sample)
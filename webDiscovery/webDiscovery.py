@@ -26,6 +26,7 @@ Fetch data from Internet and generate wordlists for subdomains or URIs
 
 import argparse
 import logging
+import sys
 import tldextract
 from collections import Counter
 from io import BytesIO
@@ -33,6 +34,9 @@ from pathlib import Path
 from urllib.request import urlopen
 from zipfile import ZipFile
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.psl import PSLNotFound, load_index
+
 logging.basicConfig(level=logging.INFO)
 
 parser = argparse.ArgumentParser(
@@ -60,6 +64,17 @@ parser.add_argument(
         metavar="YYYY-MM-DD",
         nargs="+",
         )
+parser.add_argument(
+        "--psl",
+        help="Use this Public Suffix List file through the offline index",
+        metavar="FILE",
+        )
+parser.add_argument(
+        "--no-fetch",
+        dest="nofetch",
+        help="Never fetch the Public Suffix List, use the offline index of the snapshot bundled with tldextract",
+        action="store_true",
+        )
 
 args = parser.parse_args()
 
@@ -82,17 +97,26 @@ def get_umbrella_data(days: list = None):
 
 
 
-def gen_sub_list(hosts: list):
-    subs_list = list(map(lambda x: tldextract.extract(x).subdomain, hosts))
+def gen_sub_list(hosts: list, index=None):
+    extract = index.extract if index is not None else tldextract.extract
+    subs_list = list(map(lambda x: extract(x).subdomain, hosts))
     for sub in subs_list:
         if '.' in sub:
             subs_list.extend(sub.split('.'))
     return Counter(subs_list).most_common()
 
 
+index = None
+if args.psl or args.nofetch:
+    try:
+        index = load_index(args.psl)
+    except (PSLNotFound, OSError) as e:
+        logging.error("Unable to load Public Suffix List: %s", e)
+        exit(1)
+
 result = None
 if args.type == "sub":
-    result = gen_sub_list(get_umbrella_data(args.days))
+    result = gen_sub_list(get_umbrella_data(args.days), index)
 
 if result is None:
     logging.error("An unexpected error has occurred")